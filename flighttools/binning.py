@@ -0,0 +1,73 @@
+""" Gap aware 5 minute and daily statistics.
+
+Samples are assigned to fixed time bins by integer division of their times,
+using the same bin sizes as the engineering archive stats (328 seconds for
+5min and 86400 seconds for daily), so a gap in the telemetry only affects
+the bins it falls in. Samples must be sorted by time. Each statistic is
+calculated for all bins at once with ufunc.reduceat.
+"""
+
+import numpy as np
+
+
+STATBINSIZES = {'5min':328.0, 'daily':86400.0}
+
+
+def getBinIndexes(times, binsize):
+    """ Return the index of the first sample in each bin and the bin numbers.
+
+    Only bins that contain at least one sample are returned.
+    """
+
+    binnums = np.floor(np.asarray(times) / binsize).astype(np.int64)
+    if len(binnums) == 0:
+        return np.zeros(0, dtype=np.int64), binnums
+
+    newbin = np.ones(len(binnums), dtype=bool)
+    newbin[1:] = binnums[1:] != binnums[:-1]
+    starts = np.flatnonzero(newbin)
+    return starts, binnums[starts]
+
+
+def getBinnedStats(times, vals, stat, minsamples=1):
+    """ Return the binned statistics for telemetry.
+
+    stat is '5min' or 'daily'. Bins with fewer than minsamples samples are
+    dropped. Returns a dict of arrays with one value per bin:
+
+       times: mean time of the samples in each bin
+       means, mins, maxes, stds: statistics of the values in each bin
+       midvals: value of the middle sample in each bin
+       samples: number of samples in each bin
+    """
+
+    binsize = STATBINSIZES[stat.lower()]
+    times = np.asarray(times, dtype=np.float64)
+    vals = np.asarray(vals, dtype=np.float64)
+
+    starts, binnums = getBinIndexes(times, binsize)
+    counts = np.diff(np.append(starts, len(times)))
+
+    if len(starts) == 0:
+        empty = np.zeros(0, dtype=np.float64)
+        return {'times':empty, 'means':empty, 'mins':empty, 'maxes':empty,
+                'midvals':empty, 'stds':empty,
+                'samples':np.zeros(0, dtype=np.int64)}
+
+    means = np.add.reduceat(vals, starts) / counts
+    deviations = vals - np.repeat(means, counts)
+    stds = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+
+    stats = {'times':np.add.reduceat(times, starts) / counts,
+             'means':means,
+             'mins':np.minimum.reduceat(vals, starts),
+             'maxes':np.maximum.reduceat(vals, starts),
+             'midvals':vals[starts + counts // 2],
+             'stds':stds,
+             'samples':counts}
+
+    if minsamples > 1:
+        keep = counts >= minsamples
+        stats = {key:value[keep] for key, value in stats.items()}
+
+    return stats
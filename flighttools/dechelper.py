@@ -7,8 +7,17 @@ import Ska
 import Ska.engarchive.fetch_eng as fetch
 import Chandra.Time as ct
 
+import binning
+
 class fetchobject(Ska.engarchive.fetch.Msid):
-    def __init__(self, msid, times, vals, tstart, tstop, stat=None):
+    def __init__(self, msid, times, vals, tstart, tstop, stat=None,
+                 exclusions=None):
+        # Excluded periods (an exclusions.ExclusionTable) are removed before
+        # any stats are calculated
+        if exclusions is not None:
+            keep = exclusions.keepMask(times)
+            times = times[keep]
+            vals = vals[keep]
         self.times = times # This gets overwritten if stats are requested
         self.vals = vals
         self.MSID = 'DP_' + msid.upper()
@@ -24,33 +33,9 @@ class fetchobject(Ska.engarchive.fetch.Msid):
 
 
 def getstats(data, stat):
-
-    tstart = data.times[0]
-    tstop = data.times[-1]
-    dt = np.diff(data.times)[0]
-
-    if stat.lower() == '5min':
-        pts = int(round(328 / dt))
-    elif stat.lower() == 'daily':
-        pts = int(round(86400 / dt))
-
-    if stat:
-        # Note this assumes no missing values...
-        numintervals = int(len(data.times) / pts)
-
-        timemat = np.reshape(data.times[:numintervals * pts], (numintervals, pts))
-        valmat = np.reshape(data.vals[:numintervals * pts], (numintervals, pts))
-
-        meantimes = np.mean(timemat, axis=1)
-        meanvals = np.mean(valmat, axis=1)
-        minvals = np.min(valmat, axis=1)       
-        maxvals = np.max(valmat, axis=1)
-        stds = np.std(valmat, axis=1)
-        midvals = valmat[:, round(pts/2)]
-
-        returndict = {'times':meantimes, 'means':meanvals, 'mins':minvals,
-                      'maxes':maxvals, 'midvals':midvals, 'stds':stds}
-        return returndict
+    """ Return the 5min or daily stats for the data, see binning.py.
+    """
+    return binning.getBinnedStats(data.times, data.vals, stat)
 
 
 def OBAHCHK(time1, time2, stat=None):
@@ -127,3 +112,16 @@ def DUTYCYCLE(time1, time2, stat=None):
 
 
     
+
+
+# Derived msids that can be plotted by name, keyed by upper case name. Each
+# function is called as func(time1, time2, stat=stat) and returns a
+# fetchobject.
+DERIVEDMSIDS = {'OBAHCHK':OBAHCHK, 'HADG':HADG, 'POBA':POBA, 'PSUM':PSUM,
+                'DUTYCYCLE':DUTYCYCLE}
+
+
+def registerDerivedMSID(name, func):
+    """ Add a derived msid to DERIVEDMSIDS.
+    """
+    DERIVEDMSIDS[name.upper()] = func
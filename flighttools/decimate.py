@@ -0,0 +1,65 @@
+""" Min/max preserving decimation of plot traces.
+
+A trace with many more samples than horizontal pixels is reduced before it
+is plotted. The time range is split into equal width buckets and only the
+first, last, minimum, and maximum samples in each bucket are kept, in time
+order. The decimated line therefore reaches every extreme of the original
+data, and any level the original line crosses (such as a limit) is still
+crossed within the same bucket, since the line passes through the bucket
+minimum and maximum and joins adjacent buckets through their first and last
+samples.
+"""
+
+import numpy as np
+
+
+def _firstInBucket(mask, buckets):
+    """ Return the index of the first True value of mask in each bucket.
+    """
+    ind = np.flatnonzero(mask)
+    first = np.ones(len(ind), dtype=bool)
+    first[1:] = buckets[ind[1:]] != buckets[ind[:-1]]
+    return ind[first]
+
+
+def minMaxIndexes(times, vals, numbuckets):
+    """ Return the sorted indexes of the samples kept when decimating to
+    numbuckets time buckets, at most four samples are kept per bucket.
+
+    Times must be sorted.
+    """
+
+    times = np.asarray(times, dtype=np.float64)
+    vals = np.asarray(vals)
+    numsamples = len(times)
+
+    if numsamples <= 4 * numbuckets or numbuckets < 1:
+        return np.arange(numsamples)
+
+    span = times[-1] - times[0]
+    if span <= 0:
+        buckets = np.zeros(numsamples, dtype=np.int64)
+    else:
+        buckets = np.floor((times - times[0]) / span * numbuckets)
+        buckets = np.minimum(buckets, numbuckets - 1).astype(np.int64)
+
+    newbucket = np.ones(numsamples, dtype=bool)
+    newbucket[1:] = buckets[1:] != buckets[:-1]
+    starts = np.flatnonzero(newbucket)
+    counts = np.diff(np.append(starts, numsamples))
+    stops = starts + counts - 1
+
+    mins = np.repeat(np.minimum.reduceat(vals, starts), counts)
+    maxes = np.repeat(np.maximum.reduceat(vals, starts), counts)
+
+    keep = np.concatenate((starts, stops,
+                           _firstInBucket(vals == mins, buckets),
+                           _firstInBucket(vals == maxes, buckets)))
+    return np.unique(keep)
+
+
+def minMaxDecimate(times, vals, numbuckets):
+    """ Return the decimated times and values, see minMaxIndexes().
+    """
+    ind = minMaxIndexes(times, vals, numbuckets)
+    return np.asarray(times)[ind], np.asarray(vals)[ind]
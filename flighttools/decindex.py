@@ -0,0 +1,199 @@
+#!/usr/bin/python
+""" Index of the msids shown in GRETA dec plot files.
+
+Every dec file in a directory is parsed once with parsedecplot() and each
+trace msid, trace calculation (TCALC), and bilevel msid is mapped to the
+(file, PINDEX, TINDEX) locations where it is plotted. The modification time
+and size of each file are stored with the index, so updating the index only
+parses files that are new or have changed since the last update.
+
+Example:
+
+   python decindex.py --directory=/home/greta/AXAFSHARE/dec --indexfile=decindex.pkl
+"""
+
+import os
+import glob
+import pickle
+import argparse
+
+from greta_parse import parsedecplot
+
+
+DECDIRECTORY = '/home/greta/AXAFSHARE/dec/'
+DECINDEXFILE = 'decindex.pkl'
+
+
+def _decentries(decplots):
+    """ Return the (name, kind, PINDEX, TINDEX) entries for a parsed dec file.
+
+    kind is 'msid' for trace msids, 'calc' for trace calculations, and
+    'bilevel' for bilevel msids. Bilevels use TBINDEX in place of TINDEX.
+    """
+
+    entries = []
+    for pindex, plot in decplots['plots'].items():
+        for tindex, trace in plot['traces'].items():
+            if trace['TMSID']:
+                entries.append((trace['TMSID'].upper(), 'msid', pindex, tindex))
+            if trace['TCALC']:
+                entries.append((trace['TCALC'].upper(), 'calc', pindex, tindex))
+        for tbindex, trace in plot.get('tbtraces', {}).items():
+            if trace['TMSID']:
+                entries.append((trace['TMSID'].upper(), 'bilevel', pindex,
+                                tbindex))
+    return entries
+
+
+class DecIndex(object):
+    """ Inverted index from msid names to the dec plots that show them.
+
+    files is a dict keyed by dec file name, each value is a tuple of
+    ((mtime, size), entries, error), where entries is a list of (name, kind,
+    PINDEX, TINDEX) tuples and error is None or the message for a file that
+    could not be parsed (e.g. text only displays).
+    """
+
+    def __init__(self, directory=DECDIRECTORY, pattern='*.dec'):
+        self.directory = directory
+        self.pattern = pattern
+        self.files = {}
+        self.index = {}
+
+    def _rebuild(self):
+        self.index = {}
+        for filename in sorted(self.files.keys()):
+            for name, kind, pindex, tindex in self.files[filename][1]:
+                self.index.setdefault(name, []).append(
+                    (filename, pindex, tindex, kind))
+
+    def update(self):
+        """ Parse new and changed dec files and drop deleted files.
+
+        Returns a dict with lists of the added, changed, and removed files.
+        """
+
+        changes = {'added':[], 'changed':[], 'removed':[]}
+
+        current = {}
+        for path in glob.glob(os.path.join(self.directory, self.pattern)):
+            stat = os.stat(path)
+            current[os.path.basename(path)] = (path, (stat.st_mtime,
+                                                      stat.st_size))
+
+        for filename in list(self.files.keys()):
+            if filename not in current:
+                del self.files[filename]
+                changes['removed'].append(filename)
+
+        for filename, (path, stamp) in current.items():
+            if filename in self.files:
+                if self.files[filename][0] == stamp:
+                    continue
+                changes['changed'].append(filename)
+            else:
+                changes['added'].append(filename)
+
+            try:
+                entries = _decentries(parsedecplot(path, usecache=False))
+                error = None
+            except Exception as e:
+                entries = []
+                error = '{}: {}'.format(type(e).__name__, e)
+            self.files[filename] = (stamp, entries, error)
+
+        if changes['added'] or changes['changed'] or changes['removed']:
+            self._rebuild()
+
+        return changes
+
+    def lookup(self, name):
+        """ Return the (file, PINDEX, TINDEX, kind) locations for an msid or
+        calculation name, or an empty list if it is not plotted.
+        """
+        return list(self.index.get(name.upper(), []))
+
+    def plottedMSIDs(self, filenames=None):
+        """ Return the sorted msids that need to be fetched to plot dec files.
+
+        This includes trace msids without a TCALC entry and bilevel msids,
+        calculated traces fetch their own data. If filenames is None, all
+        indexed files are included.
+        """
+
+        if filenames is None:
+            filenames = self.files.keys()
+
+        msids = set()
+        for filename in filenames:
+            entries = self.files[os.path.basename(filename)][1]
+            calcs = set((p, t) for n, k, p, t in entries if k == 'calc')
+            for name, kind, pindex, tindex in entries:
+                if kind == 'bilevel' or (kind == 'msid' and
+                                         (pindex, tindex) not in calcs):
+                    msids.add(name)
+
+        return sorted(msids)
+
+    def errors(self):
+        """ Return a dict of error messages for files that could not be parsed.
+        """
+        return {f:v[2] for f, v in self.files.items() if v[2]}
+
+    def save(self, filename=DECINDEXFILE):
+        """ Save the indexed files as a plain dict, the index itself is
+        rebuilt when loaded.
+        """
+        state = {'directory':self.directory, 'pattern':self.pattern,
+                 'files':self.files}
+        with open(filename + '.tmp', 'wb') as fid:
+            pickle.dump(state, fid, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + '.tmp', filename)
+
+
+def loadDecIndex(filename=DECINDEXFILE):
+    with open(filename, 'rb') as fid:
+        state = pickle.load(fid)
+    decindex = DecIndex(state['directory'], pattern=state['pattern'])
+    decindex.files = state['files']
+    decindex._rebuild()
+    return decindex
+
+
+def buildDecIndex(directory=DECDIRECTORY, indexfile=DECINDEXFILE):
+    """ Load the saved index if it exists, update it, and save it.
+
+    Returns the updated DecIndex object.
+    """
+
+    if os.path.exists(indexfile):
+        decindex = loadDecIndex(indexfile)
+        decindex.directory = directory
+    else:
+        decindex = DecIndex(directory)
+
+    changes = decindex.update()
+    decindex.save(indexfile)
+
+    print('Indexed {} dec files: {} added, {} changed, {} removed'.format(
+        len(decindex.files), len(changes['added']), len(changes['changed']),
+        len(changes['removed'])))
+
+    return decindex
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--directory', default=DECDIRECTORY)
+    parser.add_argument('--indexfile', default=DECINDEXFILE)
+    parser.add_argument('--lookup', nargs='*', default=[])
+
+    args = vars(parser.parse_args())
+
+    decindex = buildDecIndex(args['directory'], indexfile=args['indexfile'])
+    for name in args['lookup']:
+        for filename, pindex, tindex, kind in decindex.lookup(name):
+            print('{} {} PINDEX {} TINDEX {} ({})'.format(
+                name.upper(), filename, pindex, tindex, kind))
@@ -9,6 +9,24 @@ import Chandra.Time as ct
 sys.path.append('/home/mdahmer/Library/Python/FlightTools/flighttools')
 import gretafun
 import dechelper
+import fetchcache
+import exclusions
+import binning
+import statestats
+import rolling
+import decimate
+import summarystats
+
+# Memoized source of each msid name: 'archive' (in the archive content or
+# fetched successfully), 'derived' (defined in dechelper.DERIVEDMSIDS), or
+# 'unknown'.
+_msidsources = {}
+
+# Used when fetchstat='auto'. Full resolution sample periods vary by msid, so
+# full resolution data are assumed to be sampled once per major frame when
+# estimating the number of points plotted.
+FULLRESPERIOD = 32.8
+MAXPLOTPOINTS = 8000
 
 def debug(locals):
     import code
@@ -36,22 +54,36 @@ class plotdata(object):
        make the plots more relevant to monitoring trends during nominal
        operations.
 
+    If fetchstat is 'auto', full resolution data, 5min stats, or daily stats
+    are used depending on the time span, so that no more than about
+    MAXPLOTPOINTS points are plotted for each trace.
+
     '''
 
-    def __init__(self, msid, tstart, tstop, plotstat=None, fetchstat=None, type='numeric'):
+    def __init__(self, msid, tstart, tstop, plotstat=None, fetchstat=None, type='numeric',
+                 statwindow=86400.0, pixels=None):
         self.msid = msid
         self.time1 = tstart
         self.time2 = tstop
         self.plotstat = plotstat # calculated stat as defined in dec file
-        self.fetchstat = fetchstat # archive stat ('5min', 'daily', or None)
+        self.fetchstat = fetchstat # archive stat ('5min', 'daily', 'auto', or None)
+        self.statwindow = statwindow # max/min window (seconds) for full resolution data
+        self.autofetch = fetchstat == 'auto'
+        if self.autofetch:
+            self.fetchstat = self._selectfetchstat()
         self.__dict__.update(self._gettracetelemetry())
         self.__dict__.update(self._getploplotstats())
+
+        # Reduce the plotted data to about 2 points per horizontal pixel, the
+        # stats above are calculated from the original data.
+        if pixels:
+            self._decimateplotdata(pixels)
         
     def _gettracetelemetry(self):
         '''Retrieve, configure and return telemetry.
         '''
 
-        telem = self._fetchhelper(stat=self.fetchstat)
+        telem = self._fetchcombined(stat=self.fetchstat)
 
         # This ensures plotstat is defined as a string to make the tests below
         # more straightforward.
@@ -65,10 +97,16 @@ class plotdata(object):
         # Grab/calculate the requested data
         if self.plotstat.lower() == 'max':
             # It is assumed that all msids that use this stat are numeric
-            if self.fetchstat:
+            if self.fetchstat and self.autofetch:
+                # Stats were chosen only to reduce the data fetched, so
+                # keep the same rolling window used for full resolution data
+                telem.plotdata = rolling.rollingMax(telem.times, telem.maxes,
+                                                    self.statwindow)
+            elif self.fetchstat:
                 telem.plotdata = telem.maxes
             else:
-                telem.plotdata = np.maximum.accumulate(telem.vals)
+                telem.plotdata = rolling.rollingMax(telem.times, telem.vals,
+                                                    self.statwindow)
 
             telem.plottimes = telem.times
 
@@ -77,10 +115,14 @@ class plotdata(object):
 
         elif self.plotstat.lower() == 'min':
             # It is assumed that all msids that use this stat are numeric
-            if self.fetchstat:
+            if self.fetchstat and self.autofetch:
+                telem.plotdata = rolling.rollingMin(telem.times, telem.mins,
+                                                    self.statwindow)
+            elif self.fetchstat:
                 telem.plotdata = telem.mins
             else:
-                telem.plotdata = np.minimum.accumulate(telem.vals)
+                telem.plotdata = rolling.rollingMin(telem.times, telem.vals,
+                                                    self.statwindow)
 
             telem.plottimes = telem.times
 
@@ -105,21 +147,41 @@ class plotdata(object):
                 # Remember that the character values are replaced with their 
                 # corresponding raw values in the self._gettelemetry function.
                 #
-                # Since state based data will require the stats to be 
-                # recalculated from the original data, refetch the full 
-                # resolution data here and then calculate the means.
-                telem = self._fetchhelper(stat=None)
-                datadict = self._gettelemstats(telem, stat='daily')
-
-                # Here you are copying over all the new stats, but you only
-                # need the means and times
-                telem.__dict__.update(datadict)
+                # Daily stats for state msids are read from the state stats
+                # database (see statestats.py) when the msid is stored there.
+                # Otherwise the stats are recalculated from the original
+                # data, refetch the full resolution data here and then
+                # calculate the means.
+                datadict = statestats.getStateStats(
+                    self.msid.strip(),
+                    ct.DateTime(self.time1).secs - 5 * 24 * 3600,
+                    ct.DateTime(self.time2).secs + 5 * 24 * 3600)
+
+                if datadict is not None:
+                    telem.__dict__.update(datadict)
+                    telem.vals = telem.means
+                    telem.type = 'state'
+                    telem = self._removetimescaller(telem, 'daily')
+                else:
+                    telem = self._fetchhelper(stat=None)
+                    datadict = self._gettelemstats(telem, stat='daily')
+
+                    # Here you are copying over all the new stats, but you
+                    # only need the means and times
+                    telem.__dict__.update(datadict)
+
                 telem.plotdata = telem.means
                 telem.plottimes = telem.times
 
             name = name + '-avg'
 
             
+        elif self.autofetch and 'maxes' in telem.__dict__.keys():
+            # Plot the min and max of each bin so the line covers the same
+            # range as the full resolution data would.
+            telem.plotdata = np.column_stack((telem.mins, telem.maxes)).ravel()
+            telem.plottimes = np.repeat(telem.times, 2)
+
         else:
             telem.plotdata = telem.vals
             telem.plottimes = telem.times
@@ -145,18 +207,108 @@ class plotdata(object):
         return tracedata
 
 
-    def _fetchhelper(self, stat):
+    def _selectfetchstat(self):
+        '''Return the archive stat to fetch when fetchstat is 'auto'.
+
+        The finest resolution that keeps the number of plotted points below
+        MAXPLOTPOINTS is used. Each stat bin is plotted as a min and a max
+        (2 points). The 5 day padding added in _fetchhelper() is removed
+        before plotting, so it is not counted. The plotted data are reduced
+        further to the plot width afterwards (see _decimateplotdata()).
+        Daily means are always fetched as daily stats.
+        '''
+
+        if self.plotstat and self.plotstat.lower() == 'mean':
+            return 'daily'
+
+        span = ct.DateTime(self.time2).secs - ct.DateTime(self.time1).secs
+        if span / FULLRESPERIOD <= MAXPLOTPOINTS:
+            return None
+        elif 2 * span / binning.STATBINSIZES['5min'] <= MAXPLOTPOINTS:
+            return '5min'
+        else:
+            return 'daily'
+
+
+    def _fetchcombined(self, stat):
+        '''Fetch archive stats and fill in the end of the time span.
+
+        The archive only includes stats for complete 5min and daily bins,
+        so the most recent data are fetched at full resolution and binned
+        here. Per-sample arrays that are not calculated by
+        binning.getBinnedStats() (e.g. daily percentiles) are dropped.
+
+        When the stat was chosen automatically (fetchstat='auto'), state
+        msids are fetched at full resolution since they do not have useful
+        archive stats, except for daily means which are read from the state
+        stats database (or calculated) in _gettracetelemetry(). Only in this
+        case is the whole span fetched at full resolution if the archive has
+        no stats at all.
+        '''
+
+        telem = self._fetchhelper(stat=stat)
+        if not stat:
+            return telem
+
+        if 'means' not in telem.__dict__.keys():
+            if self.autofetch and not (self.plotstat and
+                                       self.plotstat.lower() == 'mean'):
+                self.fetchstat = None
+                return self._fetchhelper(stat=None)
+            return telem
+
+        binsize = binning.STATBINSIZES[stat]
+        if len(telem.times) > 0:
+            tailstart = (np.floor(telem.times[-1] / binsize) + 1) * binsize
+        elif self.autofetch:
+            tailstart = None
+        else:
+            return telem
+
+        if tailstart is not None and \
+           tailstart >= ct.DateTime(self.time2).secs + 5 * 24 * 3600:
+            return telem
+
+        try:
+            tail = self._fetchhelper(stat=None, tstart=tailstart)
+        except ValueError:
+            return telem
+
+        if len(tail.times) == 0:
+            return telem
+
+        stats = binning.getBinnedStats(tail.times, tail.vals, stat)
+        stats['vals'] = stats['means']
+
+        for key in fetchcache._arraykeys(telem):
+            if key in stats:
+                telem.__dict__[key] = np.concatenate((telem.__dict__[key],
+                                                      stats[key]))
+            else:
+                del telem.__dict__[key]
+
+        return telem
+
+
+    def _fetchhelper(self, stat, tstart=None):
         '''Fetch telemetry.
 
         This implements a set of helper functions that can be used to
         calculate or fetch from greta data that is not in the engineering
         archive. These are located in the dechelper.py file that is expected
         to reside in the current working directory or in the Python library
-        path that is added at the top of this file.
+        path that is added at the top of this file, and are listed in
+        dechelper.DERIVEDMSIDS. Derived msids are calculated without first
+        trying the archive, and names found in neither place raise a
+        ValueError.
+
+        tstart (seconds) replaces the padded start time if given.
         '''
 
         msid = self.msid.strip() # Sometimes there is a trailing space
         time1 = ct.DateTime(self.time1).secs - 5 * 24 * 3600
+        if tstart is not None:
+            time1 = max(time1, tstart)
         time2 = ct.DateTime(self.time2).secs + 5 * 24 * 3600
 
         # Much of the code that handles the telemetry is built to expect these
@@ -173,34 +325,46 @@ class plotdata(object):
                 self.tstop = ''
 
         telem = emptyfetchobject()
-       
-        try:
-            # Try to fetch from the engineering archive
-            telem = fetch.Msid(msid, time1, time2, stat=stat)
-            
-        except ValueError as e:
-
-            print(e)
 
+        name = msid.upper()
+        source = _msidsources.get(name)
+        if source is None:
+            if name in dechelper.DERIVEDMSIDS:
+                source = 'derived'
+                _msidsources[name] = source
+            elif name in Ska.engarchive.fetch.content:
+                source = 'archive'
+                _msidsources[name] = source
+
+        if source == 'unknown':
+            raise ValueError('%s not in engineering archive, and not defined '
+                             'in dechelper.DERIVEDMSIDS.'%msid)
+
+        elif source == 'derived':
             try:
-                if stat:
-                    stat = "'" + str(stat) + "'"
-                else:
-                    stat = None
-
-                evalstring = "dechelper.%s('%s', '%s', stat=%s)"%\
-                             (msid.upper(), time1, time2, stat)
-                print('Trying dechelper: %s'%evalstring)
-                telem = eval(evalstring)
+                telem = dechelper.DERIVEDMSIDS[name](time1, time2, stat=stat)
+            except Exception as e:
+                raise ValueError('Could not calculate derived msid %s: %s'%
+                                 (msid, e))
 
-            except:
-                # Then this msid is probably not implemented, move on with
-                # the other plots
-                #debug(locals())
-                print('%s not in engineering archive, and not defined ' \
-                      'elsewhere.'%msid)
+        else:
+            try:
+                # Fetch from the engineering archive, through the cache
+                # shared by all traces
+                telem = fetchcache.fetchMsid(msid, time1, time2, stat=stat)
+                _msidsources[name] = 'archive'
+
+            except ValueError as e:
+                # Names that are not in the archive content (such as computed
+                # msids) are still tried once, and only remembered as unknown
+                # if that fails. Errors for archive msids are not remembered.
+                if source is None:
+                    _msidsources[name] = 'unknown'
+                    raise ValueError('%s not in engineering archive, and not '
+                                     'defined in dechelper.DERIVEDMSIDS: %s'%
+                                     (msid, e))
+                raise ValueError('Could not fetch %s: %s'%(msid, e))
 
-        
         if any(telem.times):
 
             # Remove unwanted data, if data exists
@@ -209,7 +373,7 @@ class plotdata(object):
             # Replace character values with their raw values for state based msids
             telem.type = 'numeric'
 
-            if isinstance(telem.vals[0], type('')):
+            if len(telem.vals) > 0 and isinstance(telem.vals[0], type('')):
                 telem.vals = np.abs(telem.raw_vals)
                 telem.type = 'state'
 
@@ -217,96 +381,52 @@ class plotdata(object):
 
 
     def _removetimescaller(self, telem, stat):
-        # There should be a better way to remove bad/unwanted data, but this
-        # works for now
-
-        # First remove the padded data
-        telem = self._removetimes(telem, stat, 
-                                ct.DateTime(self.time1).secs - 10 * 24 * 3600,
-                                ct.DateTime(self.time1).secs)
-        telem = self._removetimes(telem, stat, ct.DateTime(self.time2).secs,
-                                ct.DateTime(self.time2).secs + 10 * 24 * 3600)
-        
-        telem = self._removetimes(telem, stat, '2011:149:00:00:00',
-                                  '2011:153:00:00:00')
-        telem = self._removetimes(telem, stat, '2011:186:00:00:00',
-                                  '2011:195:00:00:00')
-        telem = self._removetimes(telem, stat, '2011:299:00:00:00',
-                                  '2011:306:00:00:00')
-        telem = self._removetimes(telem, stat, '2012:149:00:00:00',
-                                  '2012:152:00:00:00')
-        return telem
-
+        # Remove the padded data along with the periods listed in the
+        # exclusion file (safe modes, NSMs, etc.), all in one pass.
+        time1 = ct.DateTime(self.time1).secs
+        time2 = ct.DateTime(self.time2).secs
+        table = exclusions.getExclusions().union(
+            [time1 - 10 * 24 * 3600, time2], [time1, time2 + 10 * 24 * 3600])
 
-    def _removetimes(self, telem, stat, t1, t2):
-        
-        # Remove 2011 Safe Mode Data and October NSM
-        ind1 = telem.times < ct.DateTime(t1).secs
-        ind2 = telem.times > ct.DateTime(t2).secs
-        ind = ind1 | ind2
-     
-        telem.times = telem.times[ind]
-        telem.vals = telem.vals[ind]
-        if stat:
-            #if hasattr(telem, 'maxes'):
-            if 'maxes' in telem.__dict__.keys():
-                telem.maxes = telem.maxes[ind]
-                telem.mins = telem.mins[ind]
-                telem.means = telem.means[ind]
-                telem.midvals = telem.midvals[ind]
+        return exclusions.applyExclusions(telem, table)
 
-        return telem
 
     def _gettelemstats(self, data, stat):
+        # Samples are binned by time, so gaps in the telemetry do not shift
+        # the following bins.
+        return binning.getBinnedStats(data.times, data.vals, stat)
 
-        tstart = data.times[0]
-        tstop = data.times[-1]
-        dt = np.mean(np.double(np.diff(data.times)))
-
-        if stat.lower() == '5min':
-            pts = int(round(328 / dt))
-        elif stat.lower() == 'daily':
-            pts = int(round(86400 / dt))
 
-        if stat:
-            # Note this assumes no missing values...
-            numintervals = int(len(data.times) / pts)
-
-            timemat = np.reshape(data.times[:numintervals * pts], 
-                                 (numintervals, pts))
-            valmat = np.reshape(data.vals[:numintervals * pts], 
-                                (numintervals, pts))
-
-            meantimes = np.mean(timemat, axis=1)
-            meanvals = np.mean(valmat, axis=1)
-            minvals = np.min(valmat, axis=1)       
-            maxvals = np.max(valmat, axis=1)
-            stds = np.std(valmat, axis=1)
-            midvals = valmat[:, round(pts/2)]
-
-            returndict = {'times':meantimes, 'means':meanvals, 'mins':minvals,
-                          'maxes':maxvals, 'midvals':midvals, 'stds':stds}
-            return returndict
+    def _decimateplotdata(self, pixels):
+        # Each bucket keeps up to 4 points (first, last, min, max), so use
+        # one bucket for every 2 pixels.
+        ind = decimate.minMaxIndexes(self.telem.plottimes, self.telem.plotdata,
+                                     max(int(pixels / 2), 1))
+        self.telem.plottimes = self.telem.plottimes[ind]
+        self.telem.plotdata = self.telem.plotdata[ind]
 
 
     def _getploplotstats(self):
-        if 'maxes' in self.telem.__dict__.keys():
-            maxval = np.max(self.telem.maxes)
-            minval = np.min(self.telem.mins)
+        # Each stat object is calculated in one pass through the data.
+        telem = self.telem
+        keys = telem.__dict__.keys()
 
-        else:
-            maxval = np.max(self.telem.vals)
-            minval = np.min(self.telem.vals)
+        plotstats = summarystats.SummaryStats.fromArray(telem.plotdata)
 
-        plotmax = np.max(self.telem.plotdata)
-        plotmin = np.min(self.telem.plotdata)
-        plotmean = np.mean(np.double(self.telem.plotdata))
-        plotstd = np.std(np.double(self.telem.plotdata))
+        if all(k in keys for k in ['samples', 'means', 'stds', 'mins', 'maxes']):
+            # Combine the stats of each bin, this includes every sample
+            # rather than just the bin means.
+            telemstats = summarystats.SummaryStats.fromBins(
+                telem.samples, telem.means, telem.stds, telem.mins, telem.maxes)
+        else:
+            telemstats = summarystats.SummaryStats.fromArray(telem.vals)
+            if 'maxes' in keys:
+                telemstats = summarystats.SummaryStats(
+                    telemstats.count, telemstats.mean, telemstats.m2,
+                    np.min(telem.mins), np.max(telem.maxes))
 
-        meanval = np.mean(np.double(self.telem.vals))
-        stdval = np.std(np.double(self.telem.vals))
-        mintime = np.min(self.telem.times)
-        maxtime = np.max(self.telem.times)
+        if plotstats.count == 0 or telemstats.count == 0:
+            raise ValueError('No telemetry for %s'%self.msid)
 
         # if there is TDB info, throw this in as well
         if 'tdb' in self.telem.__dict__.keys():
@@ -314,8 +434,12 @@ class plotdata(object):
         else:
             tdb = None
 
-        return {'plotmax':plotmax, 'plotmin':plotmin, 'plotmean':plotmean, 
-                'telemmax':maxval, 'telemmin':minval, 'telemmean':meanval,
-                'plotstd':plotstd, 'telemstd':stdval, 'mintime':mintime, 
-                'maxtime':maxtime, 'tdb':tdb}
+        # Times are sorted
+        return {'plotmax':plotstats.max, 'plotmin':plotstats.min,
+                'plotmean':plotstats.mean, 'telemmax':telemstats.max,
+                'telemmin':telemstats.min, 'telemmean':telemstats.mean,
+                'plotstd':plotstats.std, 'telemstd':telemstats.std,
+                'mintime':telem.times[0], 'maxtime':telem.times[-1],
+                'tdb':tdb, 'plotstats':plotstats, 'telemstats':telemstats}
+
 
@@ -0,0 +1,131 @@
+""" Time periods excluded from telemetry trending.
+
+Periods such as safe modes and NSMs are not representative of nominal
+operations and are removed from trend plots. These periods are listed in a
+text file, one per line:
+
+   start stop description
+
+where start and stop are Chandra.Time compatible date strings without spaces
+and lines starting with "#" are comments. The periods are kept as sorted,
+non-overlapping start and stop times in seconds, so the samples to keep for
+any time array are found with a single searchsorted call.
+"""
+
+import os
+import numpy as np
+
+from Chandra.Time import DateTime
+
+
+EXCLUSIONFILE = os.path.join(os.path.dirname(__file__), 'exclusions.txt')
+
+
+class ExclusionTable(object):
+    """ Sorted time intervals to exclude from telemetry.
+
+    Intervals include both end points. Overlapping intervals are merged, so
+    descriptions are only kept for reference.
+    """
+
+    def __init__(self, starts, stops, descriptions=None):
+        starts = np.atleast_1d(np.asarray(starts, dtype=np.float64))
+        stops = np.atleast_1d(np.asarray(stops, dtype=np.float64))
+        if descriptions is None:
+            descriptions = [''] * len(starts)
+
+        order = np.argsort(starts, kind='mergesort')
+        self.descriptions = [descriptions[n] for n in order]
+        starts = starts[order]
+        stops = stops[order]
+
+        # Merge overlapping intervals, a new interval begins wherever the
+        # start is after all prior stops.
+        if len(starts) > 0:
+            laststop = np.maximum.accumulate(stops)
+            new = np.ones(len(starts), dtype=bool)
+            new[1:] = starts[1:] > laststop[:-1]
+            groups = np.flatnonzero(new)
+            self.starts = starts[groups]
+            self.stops = np.maximum.reduceat(stops, groups)
+        else:
+            self.starts = starts
+            self.stops = stops
+
+    def __len__(self):
+        return len(self.starts)
+
+    def union(self, starts, stops, descriptions=None):
+        """ Return a new table including additional intervals.
+        """
+        starts = np.atleast_1d(np.asarray(starts, dtype=np.float64))
+        stops = np.atleast_1d(np.asarray(stops, dtype=np.float64))
+        if descriptions is None:
+            descriptions = [''] * len(starts)
+        return ExclusionTable(np.concatenate((self.starts, starts)),
+                              np.concatenate((self.stops, stops)),
+                              self.descriptions + list(descriptions))
+
+    def keepMask(self, times):
+        """ Return a boolean mask that is False for times in any interval.
+        """
+        times = np.asarray(times)
+        ind = np.searchsorted(self.starts, times, side='right') - 1
+        excluded = ind >= 0
+        excluded[excluded] = times[excluded] <= self.stops[ind[excluded]]
+        return ~excluded
+
+
+def readExclusions(filename=EXCLUSIONFILE):
+    """ Read an exclusion file into an ExclusionTable.
+    """
+
+    starts = []
+    stops = []
+    descriptions = []
+    with open(filename, 'r') as fid:
+        for line in fid:
+            words = line.split(None, 2)
+            if len(words) < 2 or words[0].startswith('#'):
+                continue
+            starts.append(words[0])
+            stops.append(words[1])
+            descriptions.append(words[2].strip() if len(words) > 2 else '')
+
+    if not starts:
+        return ExclusionTable([], [])
+
+    return ExclusionTable(DateTime(starts).secs, DateTime(stops).secs,
+                          descriptions)
+
+
+_exclusiontables = {}
+
+
+def getExclusions(filename=EXCLUSIONFILE):
+    """ Return the ExclusionTable for a file, each file is only read once.
+    """
+    if filename not in _exclusiontables:
+        _exclusiontables[filename] = readExclusions(filename)
+    return _exclusiontables[filename]
+
+
+def applyExclusions(telem, table):
+    """ Remove excluded samples from a fetch.Msid style object.
+
+    The keep mask is computed once and applied to every array attribute
+    with one value per sample (e.g. times, vals, raw_vals, maxes, mins,
+    means, midvals). The object is modified and returned.
+    """
+
+    keep = table.keepMask(telem.times)
+    if np.all(keep):
+        return telem
+
+    numsamples = len(telem.times)
+    for key, value in list(telem.__dict__.items()):
+        if (isinstance(value, np.ndarray) and value.ndim > 0 and
+                len(value) == numsamples):
+            telem.__dict__[key] = value[keep]
+
+    return telem
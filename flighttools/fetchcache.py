@@ -0,0 +1,194 @@
+""" Range aware cache for engineering archive fetches.
+
+Plotting a set of dec files fetches the same msids over and over, often over
+overlapping time ranges (padded plot ranges, long term trend plots, and msids
+that appear in several plots or dec files). FetchCache keeps the data fetched
+for each (msid, stat) pair along with the time range it covers:
+
+   - requests inside the covered range are served as views into the cached
+     arrays, without reading the archive
+   - requests that overlap the covered range only fetch the missing data at
+     either end, which is then joined to the cached data
+   - requests that do not overlap the covered range replace it
+
+Data near the present may not be in the archive yet, so when a fetch ends
+less than ARCHIVELAG before the time of the fetch (or in the future, as the
+padded plot ranges do) the covered range only extends to the last sample
+fetched. Later requests then fetch any data archived since.
+
+The least recently used entries are dropped when the cached arrays exceed
+the memory budget.
+
+Cached arrays are read only, since they are shared by every object returned
+for that msid. Code that modifies telemetry in place should copy it first.
+"""
+
+import copy
+import numpy as np
+from collections import OrderedDict
+
+import Ska.engarchive.fetch_eng as fetch
+from Chandra.Time import DateTime
+
+
+DEFAULTMAXBYTES = 2 * 1024**3
+
+ARCHIVELAG = 7 * 24 * 3600.
+
+
+def _arraykeys(telem):
+    """ Return the names of the per-sample array attributes of a fetch object.
+    """
+    numsamples = len(telem.times)
+    return [key for key, value in telem.__dict__.items()
+            if isinstance(value, np.ndarray) and value.ndim > 0 and
+            len(value) == numsamples]
+
+
+class _CacheEntry(object):
+    """ Fetched data for one (msid, stat) pair covering tstart to tstop.
+    """
+
+    def __init__(self, telem, tstart, tstop):
+        self.telem = telem
+        self.tstart = tstart
+        self.tstop = tstop
+        self.keys = _arraykeys(telem)
+        for key in self.keys:
+            telem.__dict__[key].flags.writeable = False
+
+    @property
+    def nbytes(self):
+        return sum(self.telem.__dict__[key].nbytes for key in self.keys)
+
+    def extend(self, telem, before):
+        """ Join newly fetched data to the start (before=True) or the end of
+        the cached data. Samples that are already cached are dropped.
+        """
+
+        cached = self.telem
+        if len(cached.times) > 0:
+            if before:
+                keep = telem.times < cached.times[0]
+            else:
+                keep = telem.times > cached.times[-1]
+        else:
+            keep = np.ones(len(telem.times), dtype=bool)
+
+        if not np.any(keep):
+            return
+
+        newkeys = _arraykeys(telem)
+        keys = [key for key in self.keys if key in newkeys]
+        for key in keys:
+            new = telem.__dict__[key][keep]
+            old = cached.__dict__[key]
+            if before:
+                joined = np.concatenate((new, old))
+            else:
+                joined = np.concatenate((old, new))
+            joined.flags.writeable = False
+            cached.__dict__[key] = joined
+
+        # Drop any arrays that are not in both fetches rather than keep
+        # arrays with the wrong length.
+        for key in self.keys:
+            if key not in keys:
+                del cached.__dict__[key]
+        self.keys = keys
+
+    def view(self, tstart, tstop):
+        """ Return a copy of the fetch object with views of the data between
+        tstart and tstop.
+        """
+
+        i0, i1 = np.searchsorted(self.telem.times, [tstart, tstop])
+        telem = copy.copy(self.telem)
+        for key in self.keys:
+            telem.__dict__[key] = self.telem.__dict__[key][i0:i1]
+        telem.tstart = tstart
+        telem.tstop = tstop
+        telem.datestart = DateTime(tstart).date
+        telem.datestop = DateTime(tstop).date
+        return telem
+
+
+class FetchCache(object):
+    """ LRU cache of engineering archive data keyed by (msid, stat).
+
+    maxbytes is the memory budget for the cached arrays.
+    """
+
+    def __init__(self, maxbytes=DEFAULTMAXBYTES):
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.numfetches = 0
+
+    def _fetch(self, msid, tstart, tstop, stat):
+        self.numfetches = self.numfetches + 1
+        return fetch.Msid(msid, tstart, tstop, stat=stat)
+
+    def _coveredstop(self, entry, tstop):
+        """ Return the end of the range covered by the cached data after a
+        fetch ending at tstop, see ARCHIVELAG above.
+        """
+        if tstop < DateTime().secs - ARCHIVELAG:
+            return tstop
+        elif len(entry.telem.times) > 0:
+            return max(entry.tstart, min(tstop, entry.telem.times[-1]))
+        else:
+            return entry.tstart
+
+    def fetch(self, msid, tstart, tstop, stat=None):
+        """ Return a fetch.Msid object for msid between tstart and tstop.
+
+        Raises the same ValueError as fetch.Msid for msids that are not in
+        the archive.
+        """
+
+        tstart = DateTime(tstart).secs
+        tstop = DateTime(tstop).secs
+        key = (msid.lower(), stat)
+
+        entry = self.entries.get(key)
+
+        if entry is None or tstart > entry.tstop or tstop < entry.tstart:
+            entry = _CacheEntry(self._fetch(msid, tstart, tstop, stat),
+                                tstart, tstop)
+            entry.tstop = self._coveredstop(entry, tstop)
+            self.entries[key] = entry
+        else:
+            if tstart < entry.tstart:
+                entry.extend(self._fetch(msid, tstart, entry.tstart, stat),
+                             before=True)
+                entry.tstart = tstart
+            if tstop > entry.tstop:
+                entry.extend(self._fetch(msid, entry.tstop, tstop, stat),
+                             before=False)
+                entry.tstop = self._coveredstop(entry, tstop)
+
+        self.entries.move_to_end(key)
+        self._evict()
+
+        return entry.view(tstart, tstop)
+
+    def _evict(self):
+        """ Drop least recently used entries until the cache fits in the
+        memory budget, the most recently used entry is always kept.
+        """
+        nbytes = sum(entry.nbytes for entry in self.entries.values())
+        while nbytes > self.maxbytes and len(self.entries) > 1:
+            key, entry = self.entries.popitem(last=False)
+            nbytes = nbytes - entry.nbytes
+
+    def clear(self):
+        self.entries.clear()
+
+
+_fetchcache = FetchCache()
+
+
+def fetchMsid(msid, tstart, tstop, stat=None):
+    """ Fetch msid data through the shared module level cache.
+    """
+    return _fetchcache.fetch(msid, tstart, tstop, stat=stat)
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+""" Build the G_LIMMON history database (glimmondb.sqlite3).
+
+Each G_LIMMON.dec revision is parsed with readGLIMMON() and compared to the
+latest values already stored in the database. Only limit and expected state
+sets that changed are inserted, with an incremented modversion, so the
+database holds the complete history of every set. Sets that are removed from
+G_LIMMON are recorded as a new modversion with mlmenable set to 0.
+
+Revisions that have already been added are skipped, so adding a new revision
+only requires parsing and comparing that one file.
+
+Example:
+
+   python glimmondb.py --directory=G_LIMMON_Archive --dbfile=glimmondb.sqlite3
+"""
+
+import os
+import glob
+import sqlite3
+import argparse
+
+from Chandra.Time import DateTime
+
+from greta_parse import readGLIMMON
+from gretafun import GLIMMONDB, LIMITFIELDS
+
+
+# Columns shared by the limits and expected_states tables, in addition to
+# msid, setkey, datesec, date, and modversion.
+SETCOLUMNS = ['mlmenable', 'mlmtol', 'default_set', 'mlimsw', 'switchstate']
+
+TABLECOLUMNS = {'limits':SETCOLUMNS + LIMITFIELDS,
+                'expected_states':SETCOLUMNS + ['expst']}
+
+
+def createGLIMMONDB(db):
+    """ Create the tables and indexes if they do not already exist.
+
+    The (msid, setkey, modversion) indexes support the MAX(modversion) queries
+    used to find the current limits, the (msid, datesec) indexes support the
+    limit history queries.
+    """
+
+    cursor = db.cursor()
+    for table, columns in TABLECOLUMNS.items():
+        cursor.execute('''CREATE TABLE IF NOT EXISTS {} (msid TEXT, setkey INTEGER,
+                          datesec REAL, date TEXT, modversion INTEGER, {})'''.format(
+                          table, ', '.join(columns)))
+        cursor.execute('''CREATE INDEX IF NOT EXISTS {0}_msid_setkey_modversion
+                          ON {0} (msid, setkey, modversion)'''.format(table))
+        cursor.execute('''CREATE INDEX IF NOT EXISTS {0}_msid_datesec
+                          ON {0} (msid, datesec)'''.format(table))
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS versions (revision TEXT,
+                      version TEXT, datesec REAL, date TEXT, filename TEXT)''')
+    db.commit()
+
+
+def _revisiondate(glimmon):
+    """ Return the $Date tag of a parsed G_LIMMON file as a DateTime object.
+    """
+    d = glimmon['date']
+    return DateTime('{}-{}-{}T{}:{}:{}'.format(*d))
+
+
+def _getsetvalues(glimmon):
+    """ Return the limit and expected state sets in a parsed G_LIMMON file.
+
+    Returns a dict keyed by table name, each is a dict of value tuples (in
+    TABLECOLUMNS order) keyed by (msid, setkey).
+    """
+
+    mlmdeftol = glimmon.get('mlmdeftol', 1)
+    sets = {'limits':{}, 'expected_states':{}}
+
+    for name, msid in glimmon.items():
+        if not isinstance(msid, dict) or 'setkeys' not in msid:
+            continue
+
+        shared = [msid.get('mlmenable', 1), msid.get('mlmtol', mlmdeftol),
+                  msid.get('default', 0), msid.get('mlimsw', '')]
+
+        for setkey in msid['setkeys']:
+            limitset = msid[setkey]
+            values = shared + [limitset.get('switchstate', '')]
+            if 'expst' in limitset:
+                sets['expected_states'][(name.lower(), setkey)] = tuple(
+                    values + [limitset['expst']])
+            elif 'warning_low' in limitset:
+                sets['limits'][(name.lower(), setkey)] = tuple(
+                    values + [limitset[f] for f in LIMITFIELDS])
+
+    return sets
+
+
+def _getcurrentvalues(db, table):
+    """ Return the latest stored values and modversion for each set.
+    """
+
+    columns = TABLECOLUMNS[table]
+    cursor = db.cursor()
+    cursor.execute('''SELECT a.msid, a.setkey, a.modversion, {} FROM {} AS a
+                      WHERE a.modversion = (SELECT MAX(b.modversion) FROM {} AS b
+                      WHERE a.msid = b.msid AND a.setkey = b.setkey)'''.format(
+                      ', '.join('a.' + c for c in columns), table, table))
+
+    return {(r[0], r[1]):(r[2], tuple(r[3:])) for r in cursor.fetchall()}
+
+
+def addRevision(db, glimmon, filename=''):
+    """ Add one parsed G_LIMMON revision to the database.
+
+    Only sets that are new or changed since the latest stored values are
+    inserted. Sets that were removed are disabled (mlmenable = 0). All
+    inserts are made in a single transaction.
+
+    Returns a dict with the number of rows inserted into each table.
+    """
+
+    date = _revisiondate(glimmon)
+    newsets = _getsetvalues(glimmon)
+    inserted = {}
+
+    with db:
+        for table, columns in TABLECOLUMNS.items():
+            current = _getcurrentvalues(db, table)
+            rows = []
+
+            for key, values in newsets[table].items():
+                if key not in current:
+                    rows.append(key + (date.secs, date.date, 0) + values)
+                elif current[key][1] != values:
+                    modversion = current[key][0] + 1
+                    rows.append(key + (date.secs, date.date, modversion) +
+                                values)
+
+            # Disable sets that no longer exist, unless already disabled
+            mlmenable = columns.index('mlmenable')
+            for key, (modversion, values) in current.items():
+                if key not in newsets[table] and values[mlmenable] != 0:
+                    values = list(values)
+                    values[mlmenable] = 0
+                    rows.append(key + (date.secs, date.date, modversion + 1) +
+                                tuple(values))
+
+            db.executemany('INSERT INTO {} VALUES ({})'.format(
+                table, ', '.join(['?'] * (len(columns) + 5))), rows)
+            inserted[table] = len(rows)
+
+        db.execute('INSERT INTO versions VALUES (?, ?, ?, ?, ?)',
+                   (glimmon.get('revision'), glimmon.get('version'),
+                    date.secs, date.date, os.path.basename(filename)))
+
+    return inserted
+
+
+def buildGLIMMONDB(directory, dbfile=GLIMMONDB, pattern='G_LIMMON*.dec'):
+    """ Add all new G_LIMMON revisions in a directory to the database.
+
+    Files that were already added (by file name) are skipped. The remaining
+    files are added in order of their $Date tags. Files older than the latest
+    revision in the database are skipped, since the history can only be
+    extended forward in time.
+    """
+
+    db = sqlite3.connect(dbfile)
+    createGLIMMONDB(db)
+
+    cursor = db.cursor()
+    cursor.execute('SELECT filename FROM versions')
+    added = set(r[0] for r in cursor.fetchall())
+    cursor.execute('SELECT MAX(datesec) FROM versions')
+    latest = cursor.fetchone()[0]
+
+    revisions = []
+    for filename in glob.glob(os.path.join(directory, pattern)):
+        if os.path.basename(filename) not in added:
+            glimmon = readGLIMMON(filename)
+            revisions.append((_revisiondate(glimmon).secs, filename, glimmon))
+
+    for datesec, filename, glimmon in sorted(revisions, key=lambda r: r[0]):
+        if latest is not None and datesec < latest:
+            print('Skipped {}, it is older than the latest revision in the '
+                  'database'.format(filename))
+            continue
+
+        inserted = addRevision(db, glimmon, filename=filename)
+        print('Added revision {} from {}: {}'.format(glimmon.get('revision'),
+                                                     filename, inserted))
+
+    db.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--directory', default='.')
+    parser.add_argument('--dbfile', default=GLIMMONDB)
+    parser.add_argument('--pattern', default='G_LIMMON*.dec')
+
+    args = vars(parser.parse_args())
+
+    buildGLIMMONDB(args['directory'], dbfile=args['dbfile'],
+                   pattern=args['pattern'])
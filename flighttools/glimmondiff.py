@@ -0,0 +1,145 @@
+""" Compare two G_LIMMON revisions.
+
+Both parsed G_LIMMON dicts (see greta_parse.readGLIMMON) are flattened into
+sorted arrays with one row per (msid, setkey, field) value. The two sorted
+arrays are then merge-joined to find added, removed, and changed values,
+including limits, expected states, switch states, MLMENABLE, MLMTOL, MLIMSW,
+and the default set.
+"""
+
+import numpy as np
+
+from greta_parse import readGLIMMON
+
+
+DIFFDTYPE = [('msid', 'U20'), ('setkey', 'i8'), ('field', 'U20'),
+             ('old', 'U40'), ('new', 'U40')]
+
+
+def _tostring(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def flattenGLIMMON(glimmon):
+    """ Flatten a parsed G_LIMMON dict into sorted arrays.
+
+    Returns a tuple of (keys, rows, metadata):
+
+    keys is a sorted array of unique string keys, one per row, used to join
+    two revisions.
+
+    rows is a structured array with msid, setkey, field, and value fields,
+    in the same order as keys. Values are stored as strings (repr for
+    floats, so they compare exactly). Fields that apply to the msid as a
+    whole, such as mlmenable or mlimsw, use a setkey of -1.
+
+    metadata is a dict of the file level values (revision, version, date,
+    database, mlmdeftol, mlmthrow).
+    """
+
+    rows = []
+    metadata = {}
+    for name, msid in glimmon.items():
+        if not isinstance(msid, dict):
+            metadata[name] = msid
+            continue
+
+        for key, value in msid.items():
+            if isinstance(value, dict):
+                for field, setvalue in value.items():
+                    rows.append((name, key, field, _tostring(setvalue)))
+            elif key != 'setkeys':
+                rows.append((name, -1, key, _tostring(value)))
+
+    dtype = [('msid', 'U20'), ('setkey', 'i8'), ('field', 'U20'),
+             ('value', 'U40')]
+    rows = np.array(rows, dtype=dtype)
+
+    # Offset the setkey so msid level fields sort first and all keys have the
+    # same width.
+    keys = np.array(['%s\x1f%05d\x1f%s' % (r[0], r[1] + 1, r[2])
+                     for r in rows.tolist()])
+    order = np.argsort(keys, kind='mergesort')
+
+    return keys[order], rows[order], metadata
+
+
+def _diffrows(rows, old=None, new=None):
+    diff = np.zeros(len(rows), dtype=DIFFDTYPE)
+    diff['msid'] = rows['msid']
+    diff['setkey'] = rows['setkey']
+    diff['field'] = rows['field']
+    if old is not None:
+        diff['old'] = old
+    if new is not None:
+        diff['new'] = new
+    return diff
+
+
+def diffGLIMMON(oldglimmon, newglimmon):
+    """ Return the differences between two parsed G_LIMMON dicts.
+
+    Returns a dict with these keys:
+        added: values present only in the new revision
+        removed: values present only in the old revision
+        changed: values present in both revisions that differ
+        msidsadded: msids present only in the new revision
+        msidsremoved: msids present only in the old revision
+        metadata: dict of changed file level values, as (old, new) tuples
+
+    added, removed, and changed are structured arrays with msid, setkey,
+    field, old, and new fields, sorted by msid, setkey, and field.
+    """
+
+    oldkeys, oldrows, oldmeta = flattenGLIMMON(oldglimmon)
+    newkeys, newrows, newmeta = flattenGLIMMON(newglimmon)
+
+    # Merge join the two sorted key arrays
+    if len(newkeys) > 0:
+        pos = np.searchsorted(newkeys, oldkeys)
+        pos[pos == len(newkeys)] = 0
+        inboth = newkeys[pos] == oldkeys
+    else:
+        pos = np.zeros(len(oldkeys), dtype=np.int64)
+        inboth = np.zeros(len(oldkeys), dtype=bool)
+
+    oldind = np.flatnonzero(inboth)
+    newind = pos[inboth]
+
+    innew = np.zeros(len(newkeys), dtype=bool)
+    innew[newind] = True
+
+    changedmask = oldrows['value'][oldind] != newrows['value'][newind]
+    oldchanged = oldind[changedmask]
+    newchanged = newind[changedmask]
+
+    changed = _diffrows(oldrows[oldchanged],
+                        old=oldrows['value'][oldchanged],
+                        new=newrows['value'][newchanged])
+    removed = _diffrows(oldrows[~inboth], old=oldrows['value'][~inboth])
+    added = _diffrows(newrows[~innew], new=newrows['value'][~innew])
+
+    oldmsids = np.unique(oldrows['msid'])
+    newmsids = np.unique(newrows['msid'])
+
+    metadata = {}
+    for key in sorted(set(oldmeta.keys()) | set(newmeta.keys())):
+        if oldmeta.get(key) != newmeta.get(key):
+            metadata[key] = (oldmeta.get(key), newmeta.get(key))
+
+    return {'added':added,
+            'removed':removed,
+            'changed':changed,
+            'msidsadded':np.setdiff1d(newmsids, oldmsids, assume_unique=True),
+            'msidsremoved':np.setdiff1d(oldmsids, newmsids, assume_unique=True),
+            'metadata':metadata}
+
+
+def diffGLIMMONFiles(oldfile, newfile):
+    """ Return the differences between two G_LIMMON.dec files.
+
+    See diffGLIMMON() for a description of the returned data.
+    """
+    return diffGLIMMON(readGLIMMON(oldfile), readGLIMMON(newfile))
@@ -0,0 +1,180 @@
+""" Compact array-backed representation of a parsed G_LIMMON file.
+
+readGLIMMON() returns nested dicts with one dict per msid and per limit set,
+with the file level values (revision, mlmdeftol, etc.) mixed in with the msid
+names. GLIMMONTable stores the same information in a few structured arrays:
+
+   msids: one row per msid, sorted by name, the row number is the msid index
+   limits: one row per limit set, with the msid index and the limit values
+   expected_states: one row per expected state set
+   metadata: dict of the file level values
+
+Limit and expected state rows are grouped by msid index, so the sets for one
+msid, or any vectorized selection of sets, can be found without visiting
+every msid. Dict style access (glimmontable['AACCCDPT']) returns the same
+per-msid dict as readGLIMMON() for compatibility with existing code.
+"""
+
+import numpy as np
+
+from greta_parse import readGLIMMON
+from gretafun import LIMITFIELDS
+
+
+def _strwidth(values):
+    return max([1] + [len(v) for v in values])
+
+
+class GLIMMONTable(object):
+    """ Array-backed G_LIMMON data.
+
+    Missing msid level values are stored as -1 (default, mlmenable, mlmtol)
+    or as an empty string (type, mlimsw, switchstate), matching keys that are
+    absent from the readGLIMMON() dicts.
+    """
+
+    def __init__(self, msids, limits, expected_states, metadata):
+        self.msids = msids
+        self.limits = limits
+        self.expected_states = expected_states
+        self.metadata = metadata
+
+    @classmethod
+    def fromDict(cls, glimmon):
+        """ Create a GLIMMONTable from a dict returned by readGLIMMON().
+
+        Sets that define neither limits nor an expected state are not stored.
+        """
+
+        names = sorted(n for n, v in glimmon.items() if isinstance(v, dict))
+        metadata = {k:v for k, v in glimmon.items() if not isinstance(v, dict)}
+
+        msidrows = []
+        limitrows = []
+        expstrows = []
+        for ind, name in enumerate(names):
+            msid = glimmon[name]
+            msidrows.append((name, msid.get('type', ''), msid.get('default', -1),
+                             msid.get('mlmenable', -1), msid.get('mlmtol', -1),
+                             msid.get('mlimsw', '')))
+
+            for setkey in msid.get('setkeys', []):
+                limitset = msid[setkey]
+                switchstate = limitset.get('switchstate', '')
+                if 'warning_low' in limitset:
+                    limitrows.append((ind, setkey, switchstate) +
+                                     tuple(limitset[f] for f in LIMITFIELDS))
+                elif 'expst' in limitset:
+                    expstrows.append((ind, setkey, switchstate,
+                                      limitset['expst']))
+
+        switchwidth = _strwidth([r[2] for r in limitrows + expstrows])
+
+        msiddtype = [('msid', 'U{}'.format(_strwidth(names))),
+                     ('type', 'U14'), ('default', 'i4'), ('mlmenable', 'i4'),
+                     ('mlmtol', 'i4'),
+                     ('mlimsw', 'U{}'.format(_strwidth([r[5] for r in msidrows])))]
+        limitdtype = ([('msid', 'i4'), ('setkey', 'i4'),
+                       ('switchstate', 'U{}'.format(switchwidth))] +
+                      [(f, 'f8') for f in LIMITFIELDS])
+        expstdtype = [('msid', 'i4'), ('setkey', 'i4'),
+                      ('switchstate', 'U{}'.format(switchwidth)),
+                      ('expst', 'U{}'.format(_strwidth([r[3] for r in expstrows])))]
+
+        return cls(np.array(msidrows, dtype=msiddtype),
+                   np.array(limitrows, dtype=limitdtype),
+                   np.array(expstrows, dtype=expstdtype),
+                   metadata)
+
+    def index(self, names):
+        """ Return the msid index for each name, -1 for names not in G_LIMMON.
+        """
+
+        names = np.atleast_1d(names)
+        if len(self.msids) == 0:
+            return np.full(len(names), -1, dtype=np.int64)
+        ind = np.searchsorted(self.msids['msid'], names)
+        ind[ind == len(self.msids)] = 0
+        return np.where(self.msids['msid'][ind] == names, ind, -1)
+
+    def _rows(self, table, ind):
+        start, stop = np.searchsorted(table['msid'], [ind, ind + 1])
+        return table[start:stop]
+
+    def defaultLimits(self):
+        """ Return the limits table rows for the default set of each msid.
+
+        As in glimmondb.py, msids without a DEFAULT set use set 0.
+        """
+        defaults = np.where(self.msids['default'] < 0, 0, self.msids['default'])
+        return self.limits[self.limits['setkey'] ==
+                           defaults[self.limits['msid']]]
+
+    def __getitem__(self, name):
+        """ Return the readGLIMMON() style dict for one msid.
+        """
+
+        ind = self.index(name)[0]
+        if ind < 0:
+            raise KeyError(name)
+
+        row = self.msids[ind]
+        msid = {}
+        if row['type']:
+            msid['type'] = str(row['type'])
+        for key in ['default', 'mlmenable', 'mlmtol']:
+            if row[key] >= 0:
+                msid[key] = int(row[key])
+        if row['mlimsw']:
+            msid['mlimsw'] = str(row['mlimsw'])
+
+        setkeys = []
+        for limitset in self._rows(self.limits, ind):
+            setkey = int(limitset['setkey'])
+            msid[setkey] = {f:float(limitset[f]) for f in LIMITFIELDS}
+            if limitset['switchstate']:
+                msid[setkey]['switchstate'] = str(limitset['switchstate'])
+            setkeys.append(setkey)
+
+        for expstset in self._rows(self.expected_states, ind):
+            setkey = int(expstset['setkey'])
+            msid[setkey] = {'expst':str(expstset['expst'])}
+            if expstset['switchstate']:
+                msid[setkey]['switchstate'] = str(expstset['switchstate'])
+            setkeys.append(setkey)
+
+        if setkeys:
+            msid['setkeys'] = setkeys
+
+        return msid
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        return self.index(name)[0] >= 0
+
+    def __len__(self):
+        return len(self.msids)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [str(name) for name in self.msids['msid']]
+
+    def toDict(self):
+        """ Return the full readGLIMMON() style dict, including metadata.
+        """
+        glimmon = {name:self[name] for name in self.keys()}
+        glimmon.update(self.metadata)
+        return glimmon
+
+
+def readGLIMMONTable(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec'):
+    """ Read a G_LIMMON file into a GLIMMONTable.
+    """
+    return GLIMMONTable.fromDict(readGLIMMON(filename))
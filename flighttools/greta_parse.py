@@ -1,184 +1,263 @@
 
 import numpy as np
 import re
+import os
+import copy
+import marshal
 
 import Ska.engarchive.fetch_eng as fetch_eng
 from Chandra.Time import DateTime
 
-def readGLIMMON(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec'):
-    revision_pattern = '.*\$Revision\s*:\s*([0-9.]+).*$'
-    date_pattern = '.*\$Date\s*:\s*([0-9]+)/([0-9]+)/([0-9]+)\s+([0-9]+):([0-9]+):([0-9]+).*$'
-    version_pattern = '.*Version\s*:\s*[$]?([A-Za-z0-9.:\s*]*)[$]?"\s*$'
-    database_pattern = '.*Database\s*:\s*(\w*)"\s*$'
+# Precompiled patterns used by readGLIMMON().
+#
+# _GLIMMONLINE selects the only lines readGLIMMON() acts on in one pass over
+# the file: lines whose first token is an ML* keyword or XMSID, and lines with
+# a $Revision or $Date tag. Equation and plain comment lines are skipped by
+# the regex engine without being touched in Python.
+_GLIMMONLINE = re.compile(r'\n((?:[ \t\r\f\v]*(?:ML[A-Z]+|XMSID)(?![^\s#])|'
+                          r'[^\n]*\$(?:Revision|Date))[^\n]*)')
+_REVISION = re.compile(r'.*\$Revision\s*:\s*([0-9.]+).*$')
+_DATE = re.compile(r'.*\$Date\s*:\s*([0-9]+)/([0-9]+)/([0-9]+)\s+'
+                   r'([0-9]+):([0-9]+):([0-9]+).*$')
+_VERSION = re.compile(r'.*Version\s*:\s*[$]?([A-Za-z0-9.:\s*]*)[$]?"\s*$')
+_DATABASE = re.compile(r'.*Database\s*:\s*(\w*)"\s*$')
+_XMSIDVERSION = re.compile(r'XMSID TEXTONLY ROWCOL.*COLOR.*Version')
+_XMSIDDATABASE = re.compile(r'XMSID TEXTONLY ROWCOL.*COLOR.*Database')
+
+# Parsed G_LIMMON files keyed by absolute path, each entry is a tuple of
+# ((mtime, size), marshalled glimmon dict). The dict is stored marshalled
+# since marshal.loads() builds an independent copy several times faster
+# than copy.deepcopy().
+_glimmoncache = {}
+
+
+def readGLIMMON(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec',
+                usecache=True):
+    """ Read the limits and expected states in a G_LIMMON file.
+
+    Parsed files are cached, a file is only parsed again if its modification
+    time or size changes. Set usecache to False to always parse the file.
+
+    Parsing time on a file made up mostly of MLOAD and MLIMIT lines is
+    dominated by building the nested dicts, so a cached read is roughly an
+    order of magnitude faster than parsing the file again.
+    """
+
+    cachekey = os.path.abspath(filename)
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime, stat.st_size)
+
+    if usecache and cachekey in _glimmoncache:
+        if _glimmoncache[cachekey][0] == stamp:
+            return marshal.loads(_glimmoncache[cachekey][1])
+
+    glimmon = _parseglimmon(filename)
+    _glimmoncache[cachekey] = (stamp, marshal.dumps(glimmon))
 
-    # Read the GLIMMON.dec file and store each line in "gfile"
+    return glimmon
+
+
+def _parseglimmon(filename):
+
+    # Read the GLIMMON.dec file, the leading newline lets the first line be
+    # matched like all the others.
     with open(filename, 'r') as fid:
-        gfile = fid.readlines()
+        gfile = '\n' + fid.read()
 
     # Initialize the glimmon dictionary
     glimmon = {}
 
-    # Step through each line in the GLIMMON.dec file
-    for line in gfile:
+    # A line without a comment has always lost its last character when the
+    # comment was removed. This is normally the newline, which is already
+    # excluded from the matched lines, except for an unterminated last line.
+    lastline = gfile.rfind('\n') + 1
+    if lastline < len(gfile) and '#' not in gfile[lastline:]:
+        gfile = gfile[:-1]
 
-        comment_line = line[line.find('#'):].strip()
+    # Step through each relevant line in the GLIMMON.dec file
+    for line in _GLIMMONLINE.findall(gfile):
 
-        # Remove comments
-        line = line[:line.find('#')].strip()
+        # Separate the comments
+        ind = line.find('#')
+        if ind < 0:
+            ind = len(line)
 
         # Assume the line uses whitespace as a delimiter
-        words = line.split()
+        words = line[:ind].split()
 
         if words:
-            # Only process lines that begin with MLOAD, MLIMIT, MLMTOL, MLIMSW, MLMENABLE,
-            # MLMDEFTOL, or MLMTHROW. This means that all lines with equations are
-            # omitted; we are only interested in the limits and expected states
-
-            if (words[0] == 'MLOAD') & (len(words) == 2):
-                name = words[1]
-                glimmon.update({name:{}})
+            # Only process lines that begin with MLOAD, MLIMIT, MLMTOL, MLIMSW,
+            # MLMENABLE, MLMDEFTOL, or MLMTHROW. This means that all lines with
+            # equations are omitted; we are only interested in the limits and
+            # expected states
+            key = words[0]
 
-            elif words[0] == 'MLIMIT':
+            if key == 'MLIMIT':
                 setnum = int(words[2])
-                glimmon[name].update({setnum:{}})
-                if 'setkeys' in list(glimmon[name].keys()):
-                    glimmon[name]['setkeys'].append(setnum)
+                msid = glimmon[name]
+                limitset = {}
+                msid[setnum] = limitset
+                if 'setkeys' in msid:
+                    msid['setkeys'].append(setnum)
                 else:
-                    glimmon[name]['setkeys'] = [setnum,]
+                    msid['setkeys'] = [setnum,]
 
                 if 'DEFAULT' in words:
-                    glimmon[name].update({'default':setnum})
+                    msid['default'] = setnum
 
                 if 'SWITCHSTATE' in words:
-                    ind = words.index('SWITCHSTATE')
-                    glimmon[name][setnum].update({'switchstate':words[ind+1]})
+                    pos = words.index('SWITCHSTATE')
+                    limitset['switchstate'] = words[pos + 1]
 
                 if 'PPENG' in words:
-                    ind = words.index('PPENG')
-                    glimmon[name].update({'type':'limit'})
-                    glimmon[name][setnum].update({'warning_low':
-                                                  float(words[ind + 1])})
-                    glimmon[name][setnum].update({'caution_low':
-                                                  float(words[ind + 2])})
-                    glimmon[name][setnum].update({'caution_high':
-                                                  float(words[ind + 3])})
-                    glimmon[name][setnum].update({'warning_high':
-                                                  float(words[ind + 4])})
+                    pos = words.index('PPENG')
+                    msid['type'] = 'limit'
+                    limitset['warning_low'] = float(words[pos + 1])
+                    limitset['caution_low'] = float(words[pos + 2])
+                    limitset['caution_high'] = float(words[pos + 3])
+                    limitset['warning_high'] = float(words[pos + 4])
 
                 if 'EXPST' in words:
-                    ind = words.index('EXPST')
-                    glimmon[name].update({'type':'expected_state'})
-                    glimmon[name][setnum].update({'expst':words[ind + 1]})
+                    pos = words.index('EXPST')
+                    msid['type'] = 'expected_state'
+                    limitset['expst'] = words[pos + 1]
+
+            elif (key == 'MLOAD') & (len(words) == 2):
+                name = words[1]
+                glimmon[name] = {}
+
+            elif key == 'MLMTOL':
+                glimmon[name]['mlmtol'] = int(words[1])
+
+            elif key == 'MLIMSW':
+                glimmon[name]['mlimsw'] = words[1]
+
+            elif key == 'MLMENABLE':
+                glimmon[name]['mlmenable'] = int(words[1])
 
-            elif words[0] == 'MLMTOL':
-                glimmon[name].update({'mlmtol':int(words[1])})
+            elif key == 'MLMDEFTOL':
+                glimmon['mlmdeftol'] = int(words[1])
 
-            elif words[0] == 'MLIMSW':
-                glimmon[name].update({'mlimsw':words[1]})
+            elif key == 'MLMTHROW':
+                glimmon['mlmthrow'] = int(words[1])
 
-            elif words[0] == 'MLMENABLE':
-                glimmon[name].update({'mlmenable':int(words[1])})
+            elif key == 'XMSID' or '$Revision' in line[:ind]:
+                line = line[:ind].strip()
+                match = _REVISION.match(line)
 
-            elif words[0] == 'MLMDEFTOL':
-                glimmon.update({'mlmdeftol':int(words[1])})
+                if match:
+                    glimmon['revision'] = match.group(1).strip()
+                    glimmon['version'] = match.group(1).strip()
 
-            elif words[0] == 'MLMTHROW':
-                glimmon.update({'mlmthrow':int(words[1])})
+                elif _XMSIDVERSION.match(line):
+                    version = _VERSION.match(line)
+                    glimmon['version'] = version.group(1).strip()
 
-            elif len(re.findall(revision_pattern, line)) > 0:
-                version = re.findall(revision_pattern, line)
-                glimmon.update({'revision':version[0].strip()})
-                glimmon.update({'version':version[0].strip()})
+                elif _XMSIDDATABASE.match(line):
+                    database = _DATABASE.match(line)
+                    glimmon['database'] = database.group(1).strip()
 
-            elif len(re.findall('^XMSID TEXTONLY ROWCOL.*COLOR.*Version', line)) > 0:
-                version = re.findall(version_pattern, line)
-                glimmon.update({'version':version[0].strip()})
+        elif '$' in line:
+            comment_line = line[ind:].strip()
 
-            elif len(re.findall('^XMSID TEXTONLY ROWCOL.*COLOR.*Database', line)) > 0:
-                database = re.findall(database_pattern, line)
-                glimmon.update({'database':database[0].strip()})
+            match = None
+            if '$Revision' in comment_line:
+                match = _REVISION.match(comment_line)
 
-        # elif len(re.findall('^#\$Revision', comment_line)) > 0:
-        elif len(re.findall(revision_pattern, comment_line)) > 0:
-            revision = re.findall(revision_pattern, comment_line)
-            glimmon.update({'revision':revision[0].strip()})
+            if match:
+                glimmon['revision'] = match.group(1).strip()
 
-        # elif len(re.findall('^#\$Date', comment_line)) > 0:
-        elif len(re.findall(date_pattern, comment_line)) > 0:
-            date = re.findall(date_pattern, comment_line)
-            glimmon.update({'date':date[0]})
+            elif '$Date' in comment_line:
+                match = _DATE.match(comment_line)
+                if match:
+                    glimmon['date'] = match.groups()
 
     return glimmon
 
 
-def parse_comments(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec'):
+# Precompiled patterns used by parse_comments().
+#
+# Each changelog entry starts with a header line such as:
+#   #  05-12-2016  First Last   Message text...
+_COMMENTSTART = re.compile(r'^#[ \t]+([01]\d-\d\d-20\d\d)[ \t]+(\w+[ \t]+\w+)[ \t]+(.*)$',
+                           re.MULTILINE)
+_COMMENTEND = '#' + '=' * 75
+_DETAILSTART = re.compile(r'#\s+(MSID)?From:?\s+To:?\s*\w*:?', re.IGNORECASE)
+_CHANGELIST = re.compile(r'#\s+(\w+):?\s*(\w+\s\w*)\s*[=,:]?\s*([0-9fFcC.-]+)\s*'
+                         r'(\w+\s\w*)\s*[=,:]?\s*([0-9fFcC.-]+)\s*(.*)')
 
-    with open(filename, 'r') as fid:
-        gfile = fid.readlines()
 
-    # Start at a point in the comments when they followed a predictable form
-    startline = 603
-    s = ''.join(gfile[startline:])
+def _add_changes(details):
+    """ Parse the MSID/From/To change table following a changelog message.
+    """
 
-    commentstart = '(#\s+([0|1]\d-\d\d-20\d\d)\s+(\w+\s+\w+)\s+(.*))'
+    changedict = {}
 
-    r = re.findall(commentstart, s)
+    # Operating on a line by line basis is more robust than letting the
+    # regex span newlines.
+    for line in details.split('\n'):
+        changes = _CHANGELIST.search(line)
 
-    start = [s.find(m[0]) for m in r]
-    start.append(s.find('#' + '=' * 75))
-    dates = [m[1] for m in r]
-    names = [m[2] for m in r]
-    text = [s[start[n]:start[n+1]] for n in range(len(start)-1)]
+        if changes:
+            msid = changes.group(1).lower()
+            changetype = changes.group(2).lower()
 
-    def add_changes(t, d):
+            if msid not in changedict:
+                changedict[msid] = {}
 
-        msid = '#\s+(\w+):?\s*'
-        vtype = '(\w+\s\w*)\s*[=,:]?\s*'
-        val = '([0-9fFcC.-]+)\s*'
-        dval = '(.*)'
-        changelistpattern = (msid + vtype + val + vtype + val + dval)
+            if changetype not in changedict[msid]:
+                changedict[msid][changetype] = {}
 
-        # I'm splitting this because regex .* is not behaving as expected with
-        # newlines. Operating on a line by line basis is therefor more robust.
-        details = t[d.end():].split('\n')
+            changedict[msid][changetype].update(
+                {'old':changes.group(3), 'new':changes.group(5),
+                 'description':changes.group(6)})
 
-        changedict = {}
-        for line in details:
-            changes = re.findall(changelistpattern, line)
+    return changedict
 
-            if changes:
 
-                msid = changes[0][0].lower()
-                changetype = changes[0][1].lower()
-                oldval = changes[0][2]
-                newval = changes[0][4]
-                description = changes[0][5]
+def parse_new_comments(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec',
+                       offset=0):
+    """ Parse the G_LIMMON changelog starting at a byte offset.
 
-                if msid not in changedict.keys():
-                    changedict.update({msid:{}})
+    The changelog section is found automatically: parsing starts at the first
+    entry header at or after offset, and ends at the '#====' separator line
+    following the last entry.
 
-                if changetype not in changedict[msid].keys():
-                    changedict[msid].update({changetype:{}})
+    Returns a tuple of (glimmonchanges, offset). The returned offset is the
+    byte offset of the last entry found. Passing it back in on the next call
+    only parses that entry and any entries added after it.
+    """
 
-                changedict[msid][changetype].update(
-                    {'old':oldval, 'new':newval, 'description':description})
+    with open(filename, 'rb') as fid:
+        fid.seek(offset)
+        s = fid.read().decode('utf-8', 'surrogateescape')
 
-        return changedict
+    headers = list(_COMMENTSTART.finditer(s))
 
     glimmonchanges = {}
-    for date, name, t in zip(dates, names, text):
+    if not headers:
+        return glimmonchanges, offset
 
-        datestr = date[6:] + '-' + date[:2] + '-' + date[3:5]
-        datesec = DateTime(datestr).secs
+    end = s.find(_COMMENTEND, headers[-1].end())
+    if end < 0:
+        end = len(s)
 
-        detailstart = '#\s+(MSID)?From:?\s+To:?\s*\w*:?'
-        d = re.search(detailstart, t, re.IGNORECASE & re.DOTALL)
+    starts = [m.start() for m in headers] + [end]
+
+    for n, header in enumerate(headers):
+        date = header.group(1)
+        name = header.group(2)
+        t = s[header.start():starts[n + 1]]
+
+        datestr = date[6:] + '-' + date[:2] + '-' + date[3:5]
+        entrydate = DateTime(datestr)
 
-        messagestart = t.find(name) + len(name)
+        messagestart = header.start(3) - header.start()
+        d = _DETAILSTART.search(t)
 
         if d:
             message = t[messagestart:(d.start()-1)].strip()
-            changedict = add_changes(t, d)
+            changedict = _add_changes(t[d.end():])
 
         else:
             message = t[messagestart:].strip()
@@ -187,295 +266,615 @@ def parse_comments(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec'):
         message = re.sub('\s*\n#\s+', ' ', message)
         message = re.sub('\n#', '', message)
 
-        glimmonchanges[datesec] = {'date':DateTime(datestr).date,
-                                   'name':name,
-                                   'message':message,
-                                   'changes':changedict}
+        glimmonchanges[entrydate.secs] = {'date':entrydate.date,
+                                          'name':name,
+                                          'message':message,
+                                          'changes':changedict}
 
-    return glimmonchanges
+    lastoffset = offset + len(s[:headers[-1].start()].encode('utf-8',
+                                                         'surrogateescape'))
 
-def process_limits_file(filename='limfile.txt'):
-    ''' Process the limit file
-    '''
+    return glimmonchanges, lastoffset
 
-    # Load the greta limit file
-    infile = open(filename,'r')
-    limlines = infile.readlines()
-    infile.close()
 
-    limlog = {}
+def parse_comments(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec'):
+    """ Parse all entries in the G_LIMMON changelog.
 
-    for line in limlines:
-        words = line.split()
-        if words:
+    Returns a dict keyed by the entry date in seconds. See
+    parse_new_comments() to parse only the entries added since a previous
+    call.
+    """
 
-            tstring = DateTime(words[0],'greta').date
-            msid = words[2]
-            msg = words[3]
-            currentval = words[4]
+    glimmonchanges, _ = parse_new_comments(filename)
 
+    return glimmonchanges
+
+# TDB msid metadata (owner and technical name) used by process_limits_file(),
+# loaded once per session by get_tdb_metadata().
+_tdbmetadata = None
+
+
+def _load_tdb_metadata():
+    """ Return the TDB msid metadata as a structured array sorted by msid.
+
+    This reads the whole TDB measurement table once, rather than creating a
+    fetch object for each msid. An empty table is returned if the TDB is not
+    available.
+    """
+
+    dtype = [('msid', 'U40'), ('owner', 'U40'), ('description', 'U100')]
+
+    try:
+        from Ska.tdb import tables
+        tmsrment = tables['tmsrment']
+        metadata = np.zeros(len(tmsrment['MSID']), dtype=dtype)
+        metadata['msid'] = np.char.upper(np.char.strip(
+            np.asarray(tmsrment['MSID']).astype(str)))
+        metadata['owner'] = np.asarray(tmsrment['OWNER_ID']).astype(str)
+        metadata['description'] = np.asarray(
+            tmsrment['TECHNICAL_NAME']).astype(str)
+    except Exception as e:
+        print('Unable to load TDB metadata table: {}'.format(e))
+        metadata = np.zeros(0, dtype=dtype)
+
+    return np.sort(metadata, order='msid')
+
+
+def get_tdb_metadata(msids):
+    """ Return the TDB owner and description for a group of msids.
+
+    Returns a dict of (owner, description) tuples keyed by msid. Each unique
+    msid is resolved once using the cached TDB metadata table. Msids that are
+    not in the table are looked up individually in the engineering archive,
+    and 'Not Known' is returned if that fails as well.
+    """
+
+    global _tdbmetadata
+    if _tdbmetadata is None:
+        _tdbmetadata = _load_tdb_metadata()
+
+    msids = np.unique(np.asarray(list(msids), dtype=str))
+    names = np.char.upper(msids)
+
+    ind = np.zeros(len(names), dtype=np.int64)
+    found = np.zeros(len(names), dtype=bool)
+    if len(_tdbmetadata) > 0:
+        ind = np.searchsorted(_tdbmetadata['msid'], names)
+        ind[ind == len(_tdbmetadata)] = 0
+        found = _tdbmetadata['msid'][ind] == names
+
+    metadata = {}
+    for msid, n, isfound in zip(msids.tolist(), ind.tolist(), found.tolist()):
+        if isfound:
+            metadata[msid] = (str(_tdbmetadata['owner'][n]),
+                              str(_tdbmetadata['description'][n]))
+        else:
             try:
-                fetchobj = fetch.Msid(msid, start='2001:001:00:00:00',
-                                      stop='2001:001:00:05:00')
-                owner = fetchobj.tdb.owner_id
-                description = fetchobj.tdb.technical_name
+                fetchobj = fetch_eng.Msid(msid, start='2001:001:00:00:00',
+                                          stop='2001:001:00:05:00')
+                metadata[msid] = (fetchobj.tdb.owner_id,
+                                  fetchobj.tdb.technical_name)
             except:
-                owner = 'Not Known'
-                description = 'Not Known'
-
-            # There should be 5 columns for a return to NOMINAL and 7 colums
-
-            # for a violation. In cases where data gets corrupted for whatever
-
-            # reason, the current value can be left blank. When this gets left
-
-            # blank, treat this as a violation but assign 'none' as the current
-            # value.
-
-            if len(words) == 7:
-                opr = words[5]
-                lim = words[6]
-            elif len(words) == 6:
-                currentval = 'none'
-                opr = words[4]
-                lim = words[5]
-
-            # if the current value is equal to none, then skip this
-            # line in the limits file
-            if currentval != 'none':
-
-                if msid in list(limlog.keys()):
-
-                    if 'firstviolation' in list(limlog[msid].keys()):
-
-                        # if it is nominal, then increase the toggle count
-                        if words[3] == 'NOMINAL':
-
-                            limlog[msid]['num'] = limlog[msid]['num'] + 1
-
-                            limlog[msid].update({'endtime':tstring})
-
-                        # if it is not nominal, then all you need to worry
-
-                        # about is determining what the worst violation type
-
-                        # is. This assumes that an msid won't cross a high and
-                        # low limit in the same period over which this script
-                        # is run.
-                        else:
-
-                            # The following if-else statement will not return
-                            # return correct results if both a high and a low
-                            # limit violation occurs in the same file. This
-
-                            # would only be likely to happen if the telemetry
-                            # stream were corrupt.
-                            if 'WARNING' in msg:
-                                maxval = np.max([float(currentval),
-                                                limlog[msid]['max']])
-                                minval = np.min([float(currentval),
-                                                limlog[msid]['min']])
-                                limlog[msid]['worsttype'] = msg
-                                limlog[msid]['max'] = maxval
-                                limlog[msid]['min'] = minval
-                                limlog[msid]['limit'] = lim
-
-                            elif 'CAUTION' in msg:
-                                maxval = np.max([float(currentval),
-                                                limlog[msid]['max']])
-                                minval = np.min([float(currentval),
-                                                limlog[msid]['min']])
-                                if 'worsttype' in list(limlog[msid].keys()):
-                                    if 'WARNING' not in \
-                                                    limlog[msid]['worsttype']:
-                                        limlog[msid]['worsttype'] = msg
-                                        limlog[msid]['limit'] = lim
-                                else:
-                                    limlog[msid]['worsttype'] = msg
-                                    limlog[msid]['limit'] = lim
-                                limlog[msid]['max'] = maxval
-                                limlog[msid]['min'] = minval
-
-                            else:
-                                # Then this must be an out of state violation
-                                limlog[msid]['worsttype'] = msg
-                                limlog[msid]['statelog'].append(currentval)
-
-                                # use same name as limits for simplicity
-                                limlog[msid]['limit'] = lim
-
-                    # In this case, an msid has already been recorded, but
-
-                    # without a first violation, which means it must have been
-                    # a return to nominal (since this msid already has an
-
-                    # entry)
-                    else:
-                        if msg == 'OUT-OF-STATE':
-                            limlog[msid].update({'statelog':[currentval]})
-                            limlog[msid].update({'initialvalue':currentval})
-                            limlog[msid].update({'limit':lim})
-                            limlog[msid].update({'firstviolation':tstring})
-                            limlog[msid].update({'worsttype':msg})
-
-                        elif msg == 'NOMINAL':
-                            # do nothing, this is a repeat return to nominal
-                            junk = 9
-                        else:
-                            limlog[msid].update({'max':float(currentval)})
-                            limlog[msid].update({'min':float(currentval)})
-                            limlog[msid].update({'initialvalue':
-                                                 float(currentval)})
-                            limlog[msid].update({'limit':float(lim)})
-                            limlog[msid].update({'firstviolation':tstring})
-                            limlog[msid].update({'worsttype':msg})
+                metadata[msid] = ('Not Known', 'Not Known')
+
+    return metadata
+
+
+LIMITFILEDTYPE = [('time', 'f8'), ('msid', 'U40'), ('msg', 'U20'),
+                  ('value', 'U40'), ('numvalue', 'f8'), ('limit', 'U40'),
+                  ('valid', '?')]
+
+LIMITSUMMARYDTYPE = [('msid', 'U40'), ('firstviolation', 'f8'),
+                     ('endtime', 'f8'), ('num', 'i8'), ('worsttype', 'U20'),
+                     ('max', 'f8'), ('min', 'f8'), ('initialvalue', 'U40'),
+                     ('limit', 'U40'), ('statelog', 'O'), ('state', '?'),
+                     ('firstlimit', '?'), ('nominalfirst', '?')]
 
-                else:
-                    limlog.update({msid:{}})
 
-                    limlog[msid].update({'owner':owner})
-                    limlog[msid].update({'description':description})
+def greta_times_to_secs(timestrs):
+    """ Convert GRETA time strings (YYYYDDD.hhmmssfff) to seconds.
 
-                    if words[3] != 'NOMINAL': # if NOT nominal
-                        limlog[msid].update({'firstviolation':tstring})
-                        limlog[msid].update({'worsttype':msg})
-                        limlog[msid].update({'num':0})
+    The digits are decoded as an array, and only one DateTime conversion is
+    made for each unique day.
+    """
 
-                        if msg == 'OUT-OF-STATE':
-                            limlog[msid].update({'statelog':[currentval]})
-                            limlog[msid].update({'initialvalue':currentval})
-                            limlog[msid].update({'limit':lim})
-                        else:
-                            limlog[msid].update({'max':float(currentval)})
-                            limlog[msid].update({'min':float(currentval)})
-                            limlog[msid].update({'initialvalue':
-                                                 float(currentval)})
-                            limlog[msid].update({'limit':float(lim)})
+    b = np.asarray(timestrs, dtype='S17')
+    if len(b) == 0:
+        return np.zeros(0)
 
-                    else:
-                        limlog[msid].update({'num':0})
-                        limlog[msid].update({'comment':'return to nominal ' +
+    digits = np.frombuffer(b.tobytes(), dtype=np.uint8).reshape(-1, 17)
+    digits = digits.astype(np.int64) - ord('0')
 
-                                             'is observed before violation'})
+    # Short strings are padded with null characters, treat these as zeros
+    digits[digits < 0] = 0
+
+    def number(first, last):
+        n = np.zeros(len(b), dtype=np.int64)
+        for col in range(first, last):
+            n = n * 10 + digits[:, col]
+        return n
+
+    day = number(0, 7)
+    secs = (number(8, 10) * 3600 + number(10, 12) * 60 + number(12, 14) +
+            number(14, 17) / 1000.)
+
+    days, inverse = np.unique(day, return_inverse=True)
+    daystrs = ['{:04d}:{:03d}:00:00:00.000'.format(d // 1000, d % 1000)
+               for d in days]
+
+    return np.asarray(DateTime(daystrs).secs)[inverse] + secs
+
+
+def _tofloat(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def read_limits_file(filename='limfile.txt'):
+    """ Load a GRETA limits file into a structured array.
+
+    There is one row per line with these fields:
+        time: time in seconds
+        msid: msid name
+        msg: message type (e.g. NOMINAL, CAUTION-HIGH, OUT-OF-STATE)
+        value: current value as a string
+        numvalue: current value as a float (NaN for state values)
+        limit: violated limit or expected state as a string
+        valid: False when the current value is missing
+    """
+
+    with open(filename, 'r') as fid:
+        rows = [words for words in (line.split() for line in fid) if words]
+
+    data = np.zeros(len(rows), dtype=LIMITFILEDTYPE)
+    if not rows:
+        return data
+
+    # There should be 5 columns for a return to NOMINAL and 7 columns for a
+    # violation. In cases where data gets corrupted for whatever reason, the
+    # current value can be left blank (6 columns).
+    data['time'] = greta_times_to_secs([w[0] for w in rows])
+    data['msid'] = [w[2] for w in rows]
+    data['msg'] = [w[3] for w in rows]
+    data['value'] = [w[4] if len(w) != 6 else 'none' for w in rows]
+    data['limit'] = [w[-1] if len(w) in (6, 7) else '' for w in rows]
+    data['numvalue'] = [_tofloat(v) for v in data['value']]
+    data['valid'] = data['value'] != 'none'
+
+    return data
+
+
+def summarize_limits(data, tstart=None, tstop=None):
+    """ Summarize the violations for each msid in a limits file table.
+
+    data is a structured array returned by read_limits_file(). If tstart or
+    tstop are specified, only the lines within this time range are included.
+
+    Returns a structured array with one row per msid. Times are in seconds
+    and are NaN if not defined (e.g. there was no violation or no return to
+    nominal). The fields mirror the entries in the process_limits_file()
+    dict, with these additional flags:
+        state: the first violation was an OUT-OF-STATE violation
+        firstlimit: the limit was recorded from the first violation
+        nominalfirst: a return to nominal was seen before any violation
+
+    All values are computed with group operations over the msids, there are
+    no loops over the individual lines.
+    """
+
+    keep = data['valid']
+    if tstart is not None:
+        keep = keep & (data['time'] >= DateTime(tstart).secs)
+    if tstop is not None:
+        keep = keep & (data['time'] <= DateTime(tstop).secs)
+
+    # A stable sort keeps the lines for each msid in file order
+    d = data[keep]
+    d = d[np.argsort(d['msid'], kind='mergesort')]
+
+    msids, starts, counts = np.unique(d['msid'], return_index=True,
+                                      return_counts=True)
+    summary = np.zeros(len(msids), dtype=LIMITSUMMARYDTYPE)
+    if len(d) == 0:
+        return summary
+
+    n = len(d)
+    idx = np.arange(n)
+    group = np.repeat(np.arange(len(msids)), counts)
+
+    nominal = d['msg'] == 'NOMINAL'
+    violation = ~nominal
+    warning = np.char.find(d['msg'], 'WARNING') >= 0
+    caution = ~warning & (np.char.find(d['msg'], 'CAUTION') >= 0)
+
+    # First violation for each msid, n if there are none
+    first = np.minimum.reduceat(np.where(violation, idx, n), starts)
+    hasviolation = first < n
+    isfirst = idx == first[group]
+    after = idx >= first[group]
+    first = np.minimum(first, n - 1)
+
+    state = hasviolation & (d['msg'][first] == 'OUT-OF-STATE')
+
+    # Returns to nominal after the first violation are counted as toggles
+    toggles = nominal & after
+    num = np.add.reduceat(toggles.astype(np.int64), starts)
+    endind = np.maximum.reduceat(np.where(toggles, idx, -1), starts)
+
+    # Numeric values are tracked for caution and warning violations, and for
+    # the first violation unless it is out of state. All other violations
+    # after the first are treated as state violations.
+    firstnumeric = isfirst & ~state[group]
+    numeric = after & violation & (warning | caution | firstnumeric)
+    staterows = after & violation & ~numeric
+
+    maxes = np.maximum.reduceat(np.where(numeric, d['numvalue'], -np.inf),
+                                starts)
+    mins = np.minimum.reduceat(np.where(numeric, d['numvalue'], np.inf),
+                               starts)
+    hasnumeric = np.add.reduceat(numeric.astype(np.int64), starts) > 0
+
+    # The worst type (and associated limit) is set by the first violation
+    # and every later violation except cautions, which only replace a worst
+    # type that is not a warning. So if the last non-caution violation is a
+    # warning it is the worst type, otherwise the last violation is.
+    lastviolation = np.maximum.reduceat(np.where(after & violation, idx, -1),
+                                        starts)
+    lastnoncaution = np.maximum.reduceat(
+        np.where(after & violation & (~caution | isfirst), idx, -1), starts)
+    worst = np.where(warning[lastnoncaution], lastnoncaution, lastviolation)
+
+    statecounts = np.add.reduceat(staterows.astype(np.int64), starts)
+    statelogs = np.split(d['value'][staterows], np.cumsum(statecounts)[:-1])
+
+    summary['msid'] = msids
+    summary['num'] = num
+    summary['firstviolation'] = np.where(hasviolation, d['time'][first],
+                                         np.nan)
+    summary['endtime'] = np.where(endind >= 0, d['time'][endind], np.nan)
+    summary['worsttype'] = np.where(hasviolation, d['msg'][worst], '')
+    summary['limit'] = np.where(hasviolation, d['limit'][worst], '')
+    summary['initialvalue'] = np.where(hasviolation, d['value'][first], '')
+    summary['max'] = np.where(hasnumeric, maxes, np.nan)
+    summary['min'] = np.where(hasnumeric, mins, np.nan)
+    summary['state'] = state
+    summary['firstlimit'] = hasviolation & (worst == first)
+    summary['nominalfirst'] = nominal[starts]
+    summary['statelog'] = [log.tolist() for log in statelogs]
+
+    return summary
+
+
+def limlog_view(summary):
+    """ Return a limits file summary in the process_limits_file() format.
+
+    summary is a structured array returned by summarize_limits(). The owner
+    and description of each msid are added from the TDB.
+    """
+
+    tdbmetadata = get_tdb_metadata(summary['msid'])
+
+    hasviolation = ~np.isnan(summary['firstviolation'])
+    hasendtime = ~np.isnan(summary['endtime'])
+    firstdates = np.zeros(len(summary), dtype='U21')
+    enddates = np.zeros(len(summary), dtype='U21')
+    if np.any(hasviolation):
+        firstdates[hasviolation] = DateTime(
+            summary['firstviolation'][hasviolation]).date
+    if np.any(hasendtime):
+        enddates[hasendtime] = DateTime(summary['endtime'][hasendtime]).date
 
+    limlog = {}
+    for n, row in enumerate(summary):
+        msid = str(row['msid'])
+        owner, description = tdbmetadata[msid]
+        entry = {'owner':owner, 'description':description, 'num':int(row['num'])}
+
+        if row['nominalfirst']:
+            entry['comment'] = 'return to nominal is observed before violation'
+
+        if hasviolation[n]:
+            entry['firstviolation'] = str(firstdates[n])
+            entry['worsttype'] = str(row['worsttype'])
+
+            if row['state']:
+                entry['statelog'] = list(row['statelog'])
+                entry['initialvalue'] = str(row['initialvalue'])
+                entry['limit'] = str(row['limit'])
             else:
-                print('Skipped this line in the limits file due to missing value:\n{}\n'.format(line))
+                entry['max'] = np.float64(row['max'])
+                entry['min'] = np.float64(row['min'])
+                entry['initialvalue'] = float(row['initialvalue'])
+                if row['firstlimit']:
+                    entry['limit'] = float(row['limit'])
+                else:
+                    entry['limit'] = str(row['limit'])
+
+        if hasendtime[n]:
+            entry['endtime'] = str(enddates[n])
+
+        limlog[msid] = entry
 
     return limlog
 
-def parsedecplot(decfile, removewidechars=True):
-    '''Parse a GRETA dec plot file to extract plotting data. This will not
-    grab text display data.
+
+def process_limits_file(filename='limfile.txt'):
+    ''' Process the limit file
+
+    Returns a dict of violation summaries keyed by msid. This is a view of the
+    columnar summary returned by summarize_limits(read_limits_file(filename)),
+    which is more convenient for large files or time range queries.
     '''
 
-    def finddecstring(pattern, string, rtype='string', split=False):
-        '''Search a single line in a GRETA dec file for plotting
-        information.
-
-        "pattern" is the name of the GRETA keyword
-        "string" is the string to be searched
-        "rtype" is the returned data type (currently string, int, or float)
-        "split" is a flag to allow the user to request the returned data be
-            split into a list
-        '''
-
-        rtype = str(rtype).lower()
-        p1 = re.compile('^' + pattern + '\s+(.*)$', re.MULTILINE)
-        r = p1.search(string)
-        if not isinstance(r, type(None)):
-            rval = r.group(1)
-            if split:
-                rval = rval.split()
-            if rtype == 'string':
-                if split:
-                    rval = [val.strip() for val in rval]
-                else:
-                    rval = rval.strip()
-            if rtype=='float':
-                if split:
-                    rval = [float(n) for n in rval]
-                else:
-                    rval = float(rval)
-            if rtype=='int':
-                if split:
-                    rval = [int(n) for n in rval]
-                else:
-                    rval = int(rval)
-            return rval
+    data = read_limits_file(filename)
 
-    #filename = 'Orbit_Plots/T_STT72_ISIM_ACIS.dec'
-    infile = open(decfile,'rb')
-    body = infile.read().decode('utf-8')
-    infile.close()
+    # Lines without a current value are skipped
+    for row in data[~data['valid']]:
+        print('Skipped this line in the limits file due to missing value:\n'
+              '{} {} {}\n'.format(DateTime(row['time']).date, row['msid'],
+                                   row['msg']))
 
-    decplots = {}
+    return limlog_view(summarize_limits(data))
 
-    decplots['DTITLE'] = finddecstring('DTITLE', body)
-    decplots['DSUBTITLE'] = finddecstring('DSUBTITLE', body)
-    decplots['DTYPE'] = finddecstring('DTYPE', body, split=True)
-    decplots['DTYPE'][1] = int(decplots['DTYPE'][1])
-    xdata = finddecstring('DXAXIS', body, rtype='float', split=True)
-    decplots['DXAXIS'] = [60*d for d in xdata]
 
-    r = re.split('\nPINDEX',body) # Newline excludes commented out plots
-    decplots['numplots'] = len(r)-1
+def _update_limlog(limlog, words, owner, description):
+    """ Update a process_limits_file() style dict with one limits file line.
+
+    words is the whitespace separated line. This is the incremental form of
+    summarize_limits() used when following a live limits file, each line
+    only touches the entry for its own msid.
+
+    Returns False if the line was skipped due to a missing value.
+    """
+
+    tstring = DateTime(words[0], 'greta').date
+    msid = words[2]
+    msg = words[3]
+    currentval = words[4]
+    lim = None
+
+    if len(words) == 7:
+        lim = words[6]
+    elif len(words) == 6:
+        currentval = 'none'
+        lim = words[5]
+
+    if currentval == 'none':
+        return False
+
+    if msid not in limlog:
+        entry = {'owner':owner, 'description':description, 'num':0}
+        limlog[msid] = entry
+
+        if msg == 'NOMINAL':
+            entry['comment'] = 'return to nominal is observed before violation'
+            return True
+
+    entry = limlog[msid]
+
+    if 'firstviolation' not in entry:
+        # First violation for this msid
+        if msg == 'NOMINAL':
+            # Repeat return to nominal
+            pass
+        elif msg == 'OUT-OF-STATE':
+            entry['statelog'] = [currentval]
+            entry['initialvalue'] = currentval
+            entry['limit'] = lim
+            entry['firstviolation'] = tstring
+            entry['worsttype'] = msg
+        else:
+            entry['max'] = float(currentval)
+            entry['min'] = float(currentval)
+            entry['initialvalue'] = float(currentval)
+            entry['limit'] = float(lim)
+            entry['firstviolation'] = tstring
+            entry['worsttype'] = msg
+
+    elif msg == 'NOMINAL':
+        entry['num'] = entry['num'] + 1
+        entry['endtime'] = tstring
+
+    elif 'WARNING' in msg or 'CAUTION' in msg:
+        entry['max'] = np.max([float(currentval), entry['max']])
+        entry['min'] = np.min([float(currentval), entry['min']])
+        if 'WARNING' in msg or 'WARNING' not in entry['worsttype']:
+            entry['worsttype'] = msg
+            entry['limit'] = lim
+
+    else:
+        # Then this must be an out of state violation
+        entry['worsttype'] = msg
+        entry['statelog'].append(currentval)
+        entry['limit'] = lim
+
+    return True
+
+
+class LimitFileFollower(object):
+    """ Follow a GRETA limits file that is still being written.
+
+    Each call to update() reads only the complete lines added since the
+    previous call and updates the limlog dict (same format as
+    process_limits_file()) with constant work per new line. The owner and
+    description of each msid are only looked up the first time the msid is
+    seen. If the file is replaced by a shorter one, it is read again from the
+    start.
+
+    Example:
+
+        follower = LimitFileFollower('limfile.txt')
+        while True:
+            limlog = follower.update()
+            time.sleep(10)
+    """
+
+    def __init__(self, filename='limfile.txt'):
+        self.filename = filename
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.limlog = {}
+        self.tdbmetadata = {}
+
+    def update(self):
+        """ Read any new lines and return the updated limlog dict.
+        """
+
+        with open(self.filename, 'rb') as fid:
+            fid.seek(0, 2)
+            if fid.tell() < self.offset:
+                self.reset()
+            fid.seek(self.offset)
+            chunk = fid.read()
+
+        # Leave any partially written line for the next update
+        end = chunk.rfind(b'\n') + 1
+        self.offset = self.offset + end
+
+        lines = [line.split() for line in
+                 chunk[:end].decode('utf-8', 'replace').splitlines()]
+        lines = [words for words in lines if words]
+
+        newmsids = set(words[2] for words in lines) - set(self.tdbmetadata)
+        if newmsids:
+            self.tdbmetadata.update(get_tdb_metadata(newmsids))
+
+        for words in lines:
+            owner, description = self.tdbmetadata[words[2]]
+            if not _update_limlog(self.limlog, words, owner, description):
+                print('Skipped this line in the limits file due to missing '
+                      'value:\n{}\n'.format(' '.join(words)))
+
+        return self.limlog
+
+
+# Keywords read by parsedecplot(), along with the type of each value and
+# whether the value is split into a list. Keywords are grouped by the level of
+# the dec file they describe.
+_DECFILEKEYS = {'DTITLE':(str, False), 'DSUBTITLE':(str, False),
+                'DTYPE':(str, True), 'DXAXIS':(float, True)}
+_DECPLOTKEYS = {'PTRACES':(int, False), 'PBILEVELS':(int, False),
+                'PTITLE':(str, False), 'PYLABEL':(str, False),
+                'PGRID':(int, False), 'PLEGEND':(int, False),
+                'PYAXIS':(float, True), 'PYAUTO':(int, False)}
+_DECTRACEKEYS = {'TMSID':(str, False), 'TNAME':(str, False),
+                 'TCOLOR':(str, False), 'TCALC':(str, False),
+                 'TSTAT':(str, False)}
+_DECBILEVELKEYS = {'TMSID':(str, False), 'TNAME':(str, False),
+                   'TCOLOR':(str, False)}
+
+# Matches each line that starts with a keyword in the first column, which
+# excludes commented out lines, along with the keyword value.
+_DECLINE = re.compile(r'^([A-Z]+)[ \t]+(.*?)[ \t\r]*$', re.MULTILINE)
+
+# Parsed dec files keyed by (absolute path, removewidechars), each entry is a
+# tuple of ((mtime, size), decplots).
+_decplotcache = {}
+
+
+def _decvalue(value, rtype, split):
+    if split:
+        return [rtype(v) for v in value.split()]
+    return rtype(value)
+
+
+def _parsedecbody(body, removewidechars=True):
+    """ Build the decplots dict from the text of a dec file in one pass.
+
+    Each keyword is assigned to the most recent PINDEX, TINDEX, or TBLINDEX
+    section that uses it. As with the original regex search, the first
+    occurrence of a keyword in a section is used and later occurrences are
+    ignored.
+    """
+
+    decplots = {key:None for key in _DECFILEKEYS}
     plots = {}
-    for plotdef in r[1:]:
-        num = int(re.match('\s+(\d+)[.\n]*', plotdef).group(1))
-        plots[num] = {}
-        plots[num]['PINDEX'] = num
-        plots[num]['PTRACES'] = finddecstring('PTRACES', plotdef,
-                                              rtype='int')
-        plots[num]['PBILEVELS'] = finddecstring('PBILEVELS', plotdef,
-                                                rtype='int')
-
-        plots[num]['PTITLE'] = finddecstring('PTITLE', plotdef)
-        plots[num]['PYLABEL'] = finddecstring('PYLABEL', plotdef)
-        plots[num]['PGRID'] = finddecstring('PGRID', plotdef, rtype='int')
-        plots[num]['PLEGEND'] = finddecstring('PLEGEND', plotdef,
-                                              rtype='int')
-        plots[num]['PYAXIS'] = finddecstring('PYAXIS', plotdef,
-                                             rtype='float', split=True)
-        plots[num]['PYAUTO'] = finddecstring('PYAUTO', plotdef, rtype='int')
-
-        # cycle through all TINDEX in a similar way to how you cycle through
-        # PINDEX
-        t = re.split('\nTINDEX',plotdef) # Newline excludes commented out msids
-        traces = {}
-        for tracedef in t[1:]:
-            tnum = int(re.match('\s+(\d+)[.\n]*', tracedef).group(1))
-            traces[tnum] = {}
-            traces[tnum]['TINDEX'] = tnum
-            traces[tnum]['TMSID'] = finddecstring('TMSID', tracedef)
-            traces[tnum]['TNAME'] = finddecstring('TNAME', tracedef)
-            traces[tnum]['TCOLOR'] = finddecstring('TCOLOR', tracedef)
-            traces[tnum]['TCALC'] = finddecstring('TCALC', tracedef)
-            traces[tnum]['TSTAT'] = finddecstring('TSTAT', tracedef)
-            if removewidechars:
-                if traces[tnum]['TMSID'] != None:
-                    traces[tnum]['TMSID'] = traces[tnum]['TMSID'].replace('_WIDE', '')
-                    traces[tnum]['TMSID'] = traces[tnum]['TMSID'].replace('_wide', '')
-        plots[num]['traces'] = traces
-
-        # TBLINDEX - do this separate in case they are intermingled with
-        # TINDEX definitions
-        tb = re.split('\nTBLINDEX',tracedef) # Newline excludes comments
-        if len(tb) > 1:
-            tbtraces = {}
-            for tbtracedef in tb[1:]:
-                tbnum = re.match('\s+(\d+)[.\n]*', tbtracedef)
-                tbnum = int(tbnum.group(1))
-                tbtraces[tbnum] = {}
-                tbtraces[tbnum]['TBINDEX'] = tbnum
-                tbtraces[tbnum]['TMSID'] = finddecstring('TMSID', tbtracedef)
-                tbtraces[tbnum]['TNAME'] = finddecstring('TNAME', tbtracedef)
-                tbtraces[tbnum]['TCOLOR'] = finddecstring('TCOLOR', tbtracedef)
-                if removewidechars:
-                    if traces[tnum]['TMSID'] != None:
-                        traces[tnum]['TMSID'] = traces[tnum]['TMSID'].replace('_WIDE', '')
-                        traces[tnum]['TMSID'] = traces[tnum]['TMSID'].replace('_wide', '')
-            plots[num]['tbtraces'] = tbtraces
+    plot = None
+    section = None
+    sectionkeys = {}
+
+    for line in _DECLINE.finditer(body):
+        key, value = line.groups()
+
+        if key in _DECFILEKEYS:
+            if decplots[key] is None:
+                decplots[key] = _decvalue(value, *_DECFILEKEYS[key])
+
+        elif key == 'PINDEX':
+            num = int(value.split()[0])
+            plot = {'PINDEX':num}
+            plot.update({k:None for k in _DECPLOTKEYS})
+            plot['traces'] = {}
+            plots[num] = plot
+            section = None
+
+        elif plot is None:
+            continue
+
+        elif key == 'TINDEX':
+            tnum = int(value.split()[0])
+            section = {'TINDEX':tnum}
+            section.update({k:None for k in _DECTRACEKEYS})
+            sectionkeys = _DECTRACEKEYS
+            plot['traces'][tnum] = section
+
+        elif key == 'TBLINDEX':
+            tbnum = int(value.split()[0])
+            section = {'TBINDEX':tbnum}
+            section.update({k:None for k in _DECBILEVELKEYS})
+            sectionkeys = _DECBILEVELKEYS
+            plot.setdefault('tbtraces', {})[tbnum] = section
+
+        elif key in _DECPLOTKEYS:
+            if plot[key] is None:
+                plot[key] = _decvalue(value, *_DECPLOTKEYS[key])
+
+        elif section is not None and key in sectionkeys:
+            if section[key] is None:
+                section[key] = _decvalue(value, *sectionkeys[key])
 
+    decplots['DTYPE'][1] = int(decplots['DTYPE'][1])
+    decplots['DXAXIS'] = [60*d for d in decplots['DXAXIS']]
+    decplots['numplots'] = len(plots)
     decplots['plots'] = plots
 
+    if removewidechars:
+        for plot in plots.values():
+            sections = list(plot['traces'].values())
+            sections.extend(plot.get('tbtraces', {}).values())
+            for section in sections:
+                if section['TMSID'] != None:
+                    section['TMSID'] = section['TMSID'].replace('_WIDE', '')
+                    section['TMSID'] = section['TMSID'].replace('_wide', '')
+
     return decplots
+
+
+def parsedecplot(decfile, removewidechars=True, usecache=True):
+    '''Parse a GRETA dec plot file to extract plotting data. This will not
+    grab text display data.
+
+    Parsed files are cached, a file is only parsed again if its modification
+    time or size changes. Set usecache to False to always parse the file.
+    '''
+
+    cachekey = (os.path.abspath(decfile), removewidechars)
+    stat = os.stat(decfile)
+    stamp = (stat.st_mtime, stat.st_size)
+
+    if usecache and cachekey in _decplotcache:
+        if _decplotcache[cachekey][0] == stamp:
+            return copy.deepcopy(_decplotcache[cachekey][1])
+
+    infile = open(decfile,'rb')
+    body = infile.read().decode('utf-8')
+    infile.close()
+
+    decplots = _parsedecbody(body, removewidechars=removewidechars)
+    _decplotcache[cachekey] = (stamp, decplots)
+
+    return copy.deepcopy(decplots)
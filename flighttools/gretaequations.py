@@ -0,0 +1,348 @@
+""" Compile GRETA equation definitions into vectorized NumPy evaluators.
+
+G_LIMMON (and other dec files) define derived pseudo-msids with equation
+lines of the form:
+
+   NAME = expression   # optional comment
+
+readGLIMMON() skips these lines. The tools here parse each expression once
+and generate a single NumPy expression for it, so a derived msid is evaluated
+over whole telemetry arrays at once. Each compiled Equation also lists the
+msids it depends on, so the required telemetry can be fetched in bulk.
+
+Expressions may use:
+   numbers and msid names (msid names may start with a digit, e.g. 4OHTRZ53)
+   + - * / and ** or ^ for powers, with unary + and -
+   < <= > >= == != comparisons
+   AND, OR, NOT (or &, |, ~)
+   functions: ABS, SQRT, EXP, LOG, LOG10, SIN, COS, TAN, ASIN, ACOS, ATAN,
+      ATAN2, FLOOR, CEIL, ROUND, MIN, MAX (any number of arguments), and
+      IF(condition, value_if_true, value_if_false)
+
+Function names and logical operators are not case sensitive, msid names are
+converted to upper case.
+"""
+
+import re
+import numpy as np
+
+import Ska.engarchive.fetch_eng as fetch_eng
+
+import dechelper
+
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?![A-Za-z0-9_])|
+    (?P<name>[A-Za-z0-9_]+)|
+    (?P<op>\*\*|<=|>=|==|!=|[-+*/^()<>,&|~]))''', re.VERBOSE)
+
+_EQUATIONLINE = re.compile(r'^\s*([A-Za-z0-9_]+)\s*=\s*([^=].*)$')
+
+# Function name: (numpy source, number of arguments or None if variadic)
+_FUNCTIONS = {'ABS':('np.abs', 1), 'SQRT':('np.sqrt', 1), 'EXP':('np.exp', 1),
+              'LOG':('np.log', 1), 'LOG10':('np.log10', 1),
+              'SIN':('np.sin', 1), 'COS':('np.cos', 1), 'TAN':('np.tan', 1),
+              'ASIN':('np.arcsin', 1), 'ACOS':('np.arccos', 1),
+              'ATAN':('np.arctan', 1), 'ATAN2':('np.arctan2', 2),
+              'FLOOR':('np.floor', 1), 'CEIL':('np.ceil', 1),
+              'ROUND':('np.round', 1), 'IF':('np.where', 3),
+              'MIN':('np.minimum', None), 'MAX':('np.maximum', None)}
+
+_KEYWORDS = {'MLOAD', 'MLIMIT', 'MLMTOL', 'MLIMSW', 'MLMENABLE', 'MLMDEFTOL',
+             'MLMTHROW', 'XMSID'}
+
+_COMPARISONS = ['<', '<=', '>', '>=', '==', '!=']
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if not match:
+            raise ValueError('Unexpected character in equation: {}'.format(
+                expression[pos:]))
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+class _Parser(object):
+    """ Recursive descent parser that translates an equation expression into
+    NumPy source code, msid values are read from the dict "_v".
+    """
+
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.dependencies = []
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+            if kind == 'name' and value.upper() in ('AND', 'OR', 'NOT'):
+                return ('op', value.upper())
+            return (kind, value)
+        return (None, 'end of equation')
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        token = self.next()
+        if token[1] != value:
+            raise ValueError('Expected "{}" but found "{}"'.format(value,
+                                                                   token[1]))
+
+    def parse(self):
+        source = self.orexpr()
+        if self.peek()[0] is not None:
+            raise ValueError('Unexpected "{}" in equation'.format(
+                self.peek()[1]))
+        return source
+
+    def orexpr(self):
+        source = self.andexpr()
+        while self.peek()[1] in ('OR', '|'):
+            self.next()
+            source = 'np.logical_or({}, {})'.format(source, self.andexpr())
+        return source
+
+    def andexpr(self):
+        source = self.notexpr()
+        while self.peek()[1] in ('AND', '&'):
+            self.next()
+            source = 'np.logical_and({}, {})'.format(source, self.notexpr())
+        return source
+
+    def notexpr(self):
+        if self.peek()[1] in ('NOT', '~'):
+            self.next()
+            return 'np.logical_not({})'.format(self.notexpr())
+        return self.comparison()
+
+    def comparison(self):
+        source = self.additive()
+        if self.peek()[1] in _COMPARISONS:
+            op = self.next()[1]
+            source = '({} {} {})'.format(source, op, self.additive())
+        return source
+
+    def additive(self):
+        source = self.term()
+        while self.peek()[1] in ('+', '-'):
+            op = self.next()[1]
+            source = '({} {} {})'.format(source, op, self.term())
+        return source
+
+    def term(self):
+        source = self.unary()
+        while self.peek()[1] in ('*', '/'):
+            op = self.next()[1]
+            source = '({} {} {})'.format(source, op, self.unary())
+        return source
+
+    def unary(self):
+        if self.peek()[1] in ('+', '-'):
+            op = self.next()[1]
+            return '({}{})'.format(op, self.unary())
+        return self.power()
+
+    def power(self):
+        source = self.atom()
+        if self.peek()[1] in ('**', '^'):
+            self.next()
+            source = '({} ** {})'.format(source, self.unary())
+        return source
+
+    def atom(self):
+        kind, value = self.next()
+
+        if kind == 'num':
+            return repr(float(value))
+
+        if kind == 'name':
+            if self.peek()[1] == '(':
+                return self.function(value.upper())
+            name = value.upper()
+            if name not in self.dependencies:
+                self.dependencies.append(name)
+            return '_v[{!r}]'.format(name)
+
+        if value == '(':
+            source = self.orexpr()
+            self.expect(')')
+            return source
+
+        raise ValueError('Unexpected "{}" in equation'.format(value))
+
+    def function(self, name):
+        if name not in _FUNCTIONS:
+            raise ValueError('Unknown function {} in equation'.format(name))
+        npfunc, numargs = _FUNCTIONS[name]
+
+        self.expect('(')
+        args = [self.orexpr()]
+        while self.peek()[1] == ',':
+            self.next()
+            args.append(self.orexpr())
+        self.expect(')')
+
+        if numargs is None:
+            # Reduce variadic functions (MIN, MAX) pairwise
+            source = args[0]
+            for arg in args[1:]:
+                source = '{}({}, {})'.format(npfunc, source, arg)
+            return source
+
+        if len(args) != numargs:
+            raise ValueError('{} takes {} arguments, {} given'.format(
+                name, numargs, len(args)))
+        return '{}({})'.format(npfunc, ', '.join(args))
+
+
+class Equation(object):
+    """ A compiled GRETA equation.
+
+    name: upper case name of the derived msid
+    expression: original equation text
+    dependencies: upper case names referenced by the equation, in order of
+        first use, these may be archive msids or other derived msids
+    source: generated NumPy expression
+
+    Calling an Equation with a dict of arrays keyed by the dependency names
+    returns the evaluated array.
+    """
+
+    def __init__(self, name, expression):
+        self.name = name.upper()
+        self.expression = expression.strip()
+        parser = _Parser(self.expression)
+        self.source = parser.parse()
+        self.dependencies = parser.dependencies
+        self._code = compile(self.source, '<{}>'.format(self.name), 'eval')
+
+    def __call__(self, values):
+        return eval(self._code, {'np':np, '__builtins__':{}}, {'_v':values})
+
+    def __repr__(self):
+        return '{} = {}'.format(self.name, self.expression)
+
+
+def parseEquation(line):
+    """ Return an Equation for a "NAME = expression" line, or None if the
+    line is not an equation. Comments following a "#" are ignored.
+    """
+
+    line = line.split('#')[0]
+    match = _EQUATIONLINE.match(line)
+    if not match:
+        return None
+    return Equation(match.group(1), match.group(2))
+
+
+def readEquations(filename='/home/greta/AXAFSHARE/dec/G_LIMMON.dec'):
+    """ Return a dict of compiled Equations keyed by name for a dec file.
+
+    Lines starting with a G_LIMMON keyword (MLOAD, MLIMIT, etc., or XMSID) are
+    not equations and are skipped. Later definitions of a name replace earlier ones.
+    """
+
+    equations = {}
+    with open(filename, 'r') as fid:
+        for line in fid:
+            words = line.split()
+            if not words or words[0] in _KEYWORDS or words[0].startswith('#'):
+                continue
+            equation = parseEquation(line)
+            if equation:
+                equations[equation.name] = equation
+
+    return equations
+
+
+def getBaseMSIDs(name, equations):
+    """ Return the sorted archive msids needed to evaluate a derived msid,
+    following any derived msids it depends on.
+    """
+
+    msids = set()
+    _resolveOrder(name.upper(), equations, [], set(), msids)
+    return sorted(msids)
+
+
+def _resolveOrder(name, equations, order, active, msids):
+    """ Append derived msids to order so that each comes after its
+    dependencies, archive msids are added to msids.
+    """
+
+    if name not in equations:
+        msids.add(name)
+        return
+    if name in order:
+        return
+    if name in active:
+        raise ValueError('Circular equation definition for {}'.format(name))
+
+    active.add(name)
+    for dependency in equations[name].dependencies:
+        _resolveOrder(dependency, equations, order, active, msids)
+    active.remove(name)
+    order.append(name)
+
+
+def evaluateEquation(name, equations, values):
+    """ Evaluate a derived msid over arrays of archive data.
+
+    values is a dict of arrays keyed by upper case archive msid name, all
+    sampled at the same times. Derived msids that this equation depends on
+    are evaluated first.
+    """
+
+    order = []
+    msids = set()
+    _resolveOrder(name.upper(), equations, order, set(), msids)
+
+    missing = msids - set(values.keys())
+    if missing:
+        raise KeyError('Missing values for {}'.format(', '.join(sorted(missing))))
+
+    values = dict(values)
+    for derived in order:
+        values[derived] = equations[derived](values)
+
+    return values[name.upper()]
+
+
+def _numericVals(telem):
+    """ Return numeric values for a fetched msid, state msids use the absolute
+    raw values as in decplotdata.plotdata.
+    """
+    if telem.vals.dtype.kind in 'US':
+        return np.abs(telem.raw_vals)
+    return telem.vals
+
+
+def fetchEquation(name, time1, time2, equations, stat=None):
+    """ Fetch the archive msids for a derived msid and evaluate it.
+
+    The archive msids are fetched together and interpolated onto common
+    times, as is done for the derived msids in dechelper.py. State msids
+    (such as bilevels and heater states) are evaluated using their absolute
+    raw values. Returns a dechelper.fetchobject.
+    """
+
+    msids = getBaseMSIDs(name, equations)
+    data = fetch_eng.Msidset(msids, time1, time2)
+    data.interpolate()
+
+    values = {msid.upper():_numericVals(data[msid]) for msid in data.keys()}
+    vals = evaluateEquation(name, equations, values)
+    vals = np.broadcast_to(vals, data.times.shape).astype(np.float64)
+
+    return dechelper.fetchobject(name.upper(), data.times, vals, time1, time2,
+                                 stat)
@@ -1,4 +1,6 @@
 
+import os
+import copy
 import json
 import pickle
 import numpy as np
@@ -16,6 +18,18 @@ from Chandra.Time import DateTime
 from greta_parse import *
 
 
+TDBFILE = '/home/mdahmer/AXAFAUTO/G_LIMMON_Archive/tdb_all.pkl'
+GLIMMONDB = '/home/mdahmer/AXAFAUTO/G_LIMMON_Archive/glimmondb.sqlite3'
+SAFETYLIMITTABLE = '/home/mdahmer/AXAFAUTO/G_LIMMON_Archive/safety_limits.npy'
+
+LIMITFIELDS = ['warning_low', 'caution_low', 'caution_high', 'warning_high']
+
+# Safety limit tables keyed by filename, along with the file modification
+# time, see getSafetyLimitTable().
+_safetylimittables = {}
+
+# The TDB pickle along with its modification time, see getTDBLimits().
+_tdbcache = {}
 
 def getGLIMMONLimits(MSID, glimmon=None):
     """ Get the GLIMMON limits from the glimmon datastructure
@@ -106,15 +120,21 @@ def getTDBLimits(telem, dbver='p012'):
 
     def get_tdb(dbver):
         # tdbs = json.load(open('/home/mdahmer/AXAFAUTO/G_LIMMON_Archive/tdb_all.json','r'))
-        tdbs = pickle.load(open('/home/mdahmer/AXAFAUTO/G_LIMMON_Archive/tdb_all.pkl','r'))
-        return tdbs[dbver.lower()]
+        # The pickle is only loaded again if the file has changed
+        mtime = os.path.getmtime(TDBFILE)
+        if _tdbcache.get('mtime') != mtime:
+            with open(TDBFILE, 'rb') as fid:
+                _tdbcache.update({'mtime':mtime, 'tdbs':pickle.load(fid)})
+        return _tdbcache['tdbs'][dbver.lower()]
 
     try:
         # telem is only used to pass the msid name, and is used for backwards compatibility only.
         msid = telem.msid.lower()
         tdb = get_tdb(dbver)
 
-        limits = assign_sets(tdb[msid]['limit'])
+        # Copy the sets so the cached TDB is not modified below or by the
+        # caller
+        limits = assign_sets(copy.deepcopy(tdb[msid]['limit']))
         limits['type'] = 'limit'
 
         if isnotnan(tdb[msid]['limit_default_set_num']):
@@ -145,7 +165,7 @@ def getTDBLimits(telem, dbver='p012'):
 
 
 
-def getSafetyLimits(telem):
+def getSafetyLimits(telem, table=None):
     """ Update the current database limits
 
     The database limits are replaced with the G_LIMMON limits if the
@@ -173,10 +193,27 @@ def getSafetyLimits(telem):
     In the future this function can add the ability to traverse all limit sets
     for a single MSID
 
+    table is an optional safety limit table generated by
+    buildSafetyLimitTable(). If this is not passed, the table saved in
+    SAFETYLIMITTABLE is used if it exists (see getSafetyLimitTable()). The
+    merged limits are looked up in this table instead of being recalculated
+    from the TDB and G_LIMMON database for this one msid. The rest of the TDB
+    default limit set is returned along with these limits, the same as when
+    the limits are calculated. The limits that were updated are listed in the
+    changelog returned by buildSafetyLimitTable().
+
     #FIXME PRIORITY LOW Add the ability to update multiple limit sets for a
     a single msid#
     """
 
+    if table is None:
+        table = getSafetyLimitTable()
+
+    if table is not None:
+        safetylimits = getTDBLimits(telem)
+        safetylimits.update(lookupSafetyLimits(telem.msid, table))
+        return safetylimits
+
     # Set the safetylimits dict here. An empty dict is returned if there are no
     # limits specified. This is intended and relied upon later.
     safetylimits = getTDBLimits(telem)
@@ -187,7 +224,7 @@ def getSafetyLimits(telem):
 
     # Read the GLIMMON data
     try:
-        db = sqlite3.connect('/home/mdahmer/AXAFAUTO/G_LIMMON_Archive/glimmondb.sqlite3')
+        db = sqlite3.connect(GLIMMONDB)
         cursor = db.cursor()
         cursor.execute('''SELECT a.msid, a.setkey, a.default_set, a.warning_low, 
                           a.caution_low, a.caution_high, a.warning_high FROM limits AS a 
@@ -222,23 +259,186 @@ def getSafetyLimits(telem):
 
         if glimits['warning_low'] < safetylimits['warning_low']:
             safetylimits['warning_low'] = glimits['warning_low']
-            print('Updated warning low safety limit for %s'%telem.msid)
 
         if glimits['caution_low'] < safetylimits['caution_low']:
             safetylimits['caution_low'] = glimits['caution_low']
-            print('Updated caution low safety limit for %s'%telem.msid)
 
         if glimits['warning_high'] > safetylimits['warning_high']:
             safetylimits['warning_high'] = glimits['warning_high']
-            print('Updated warning high safety limit for %s'%telem.msid)
 
         if glimits['caution_high'] > safetylimits['caution_high']:
             safetylimits['caution_high'] = glimits['caution_high']
-            print('Updated caution high safety limit for %s'%telem.msid)
 
     return safetylimits
 
 
+def _getTDBDefaultLimitArray(dbver='p012'):
+    """ Return the TDB default limit sets for all msids as a structured array.
+
+    Only msids with numeric limits are included. Rows are sorted by msid.
+    """
+
+    with open(TDBFILE, 'rb') as fid:
+        tdb = pickle.load(fid)[dbver.lower()]
+
+    rows = []
+    for msid in tdb.keys():
+        try:
+            dbsets = tdb[msid]['limit']
+            defaultnum = tdb[msid]['limit_default_set_num']
+        except (KeyError, TypeError):
+            continue
+
+        # TDB set numbers are one based, see getTDBLimits(). A missing (NaN)
+        # default set number means the first set is the default.
+        try:
+            defaultnum = int(defaultnum)
+        except (TypeError, ValueError):
+            defaultnum = 1
+
+        for setnum in dbsets.keys():
+            if int(setnum) == defaultnum:
+                lims = dbsets[setnum]
+                try:
+                    rows.append((msid.lower(),) +
+                                tuple(float(lims[f]) for f in LIMITFIELDS))
+                except KeyError:
+                    pass
+                break
+
+    dtype = [('msid', 'U20')] + [(f, 'f8') for f in LIMITFIELDS]
+    return np.sort(np.array(rows, dtype=dtype), order='msid')
+
+
+def _getGLIMMONDefaultLimitArray(dbfile=GLIMMONDB):
+    """ Return the latest G_LIMMON default limit sets as a structured array.
+
+    Rows are sorted by msid.
+    """
+
+    db = sqlite3.connect(dbfile)
+    cursor = db.cursor()
+    cursor.execute('''SELECT a.msid, a.warning_low, a.caution_low, a.caution_high,
+                      a.warning_high FROM limits AS a
+                      WHERE a.setkey = a.default_set
+                      AND a.modversion = (SELECT MAX(b.modversion) FROM limits AS b
+                      WHERE a.msid = b.msid and a.setkey = b.setkey)''')
+    rows = [(r[0].lower(),) + tuple(r[1:]) for r in cursor.fetchall()]
+    db.close()
+
+    dtype = [('msid', 'U20')] + [(f, 'f8') for f in LIMITFIELDS]
+    return np.sort(np.array(rows, dtype=dtype), order='msid')
+
+
+def buildSafetyLimitTable(dbver='p012', dbfile=GLIMMONDB, filename=None):
+    """ Generate the safety limits for all msids at once.
+
+    This applies the same rules as getSafetyLimits() to every msid in the TDB
+    and G_LIMMON database. The TDB and G_LIMMON default limit sets are aligned
+    by msid and the most permissive value of each individual limit is kept.
+
+    Returns a tuple of (table, changelog):
+
+    table is a structured array sorted by msid, with one row per msid and the
+    merged warning_low, caution_low, caution_high, and warning_high limits.
+
+    changelog is a structured array listing each TDB limit that was replaced
+    by a more permissive G_LIMMON limit, with fields msid, limit, old, and new.
+
+    If filename is specified, the table is also saved to this file so it can
+    be loaded later using loadSafetyLimitTable().
+    """
+
+    tdb = _getTDBDefaultLimitArray(dbver)
+    glim = _getGLIMMONDefaultLimitArray(dbfile)
+
+    msids = np.union1d(tdb['msid'], glim['msid'])
+    tdbind = np.searchsorted(msids, tdb['msid'])
+    glimind = np.searchsorted(msids, glim['msid'])
+
+    table = np.zeros(len(msids), dtype=tdb.dtype)
+    table['msid'] = msids
+
+    changedtype = [('msid', 'U20'), ('limit', 'U12'), ('old', 'f8'),
+                   ('new', 'f8')]
+    changes = []
+
+    for field in LIMITFIELDS:
+        tdbvals = np.full(len(msids), np.nan)
+        tdbvals[tdbind] = tdb[field]
+        glimvals = np.full(len(msids), np.nan)
+        glimvals[glimind] = glim[field]
+
+        # fmin/fmax ignore the NaN placeholders, so msids that are only
+        # defined in one source just keep those limits.
+        if 'low' in field:
+            table[field] = np.fmin(tdbvals, glimvals)
+            updated = glimvals < tdbvals
+        else:
+            table[field] = np.fmax(tdbvals, glimvals)
+            updated = glimvals > tdbvals
+
+        fieldchanges = np.zeros(np.count_nonzero(updated), dtype=changedtype)
+        fieldchanges['msid'] = msids[updated]
+        fieldchanges['limit'] = field
+        fieldchanges['old'] = tdbvals[updated]
+        fieldchanges['new'] = glimvals[updated]
+        changes.append(fieldchanges)
+
+    changelog = np.sort(np.concatenate(changes), order=['msid', 'limit'])
+
+    if filename:
+        np.save(filename, table)
+
+    return table, changelog
+
+
+def loadSafetyLimitTable(filename=SAFETYLIMITTABLE):
+    """ Load a safety limit table saved by buildSafetyLimitTable().
+    """
+    return np.load(filename)
+
+
+def getSafetyLimitTable(filename=SAFETYLIMITTABLE):
+    """ Return the saved safety limit table.
+
+    If the TDB or G_LIMMON database has changed since the table was saved,
+    the table is rebuilt and saved again. Each file is only read again if it
+    has changed.
+
+    Returns None if the table has not been saved, see
+    buildSafetyLimitTable().
+    """
+    if not os.path.exists(filename):
+        return None
+
+    mtime = os.path.getmtime(filename)
+    if any(os.path.exists(source) and os.path.getmtime(source) > mtime
+           for source in (TDBFILE, GLIMMONDB)):
+        buildSafetyLimitTable(dbfile=GLIMMONDB, filename=filename)
+        mtime = os.path.getmtime(filename)
+
+    if _safetylimittables.get(filename, (None, None))[0] != mtime:
+        _safetylimittables[filename] = (mtime, loadSafetyLimitTable(filename))
+    return _safetylimittables[filename][1]
+
+
+def lookupSafetyLimits(msid, table):
+    """ Return the safety limits for one msid from a safety limit table.
+
+    An empty dict is returned if the msid has no limits, to be consistent
+    with getSafetyLimits().
+    """
+
+    msid = msid.lower()
+    ind = np.searchsorted(table['msid'], msid)
+
+    if ind < len(table) and table['msid'][ind] == msid:
+        return {f:float(table[f][ind]) for f in LIMITFIELDS}
+    else:
+        return {}
+
+
 def readxlist(filename, data=None):
 
     # there's probably a faster way to do this with recarrays
@@ -0,0 +1,195 @@
+""" Vectorized G_LIMMON limit checking.
+
+G_LIMMON can define several limit sets for one msid, where the active set is
+selected by the state of a switch msid (MLIMSW) matching the SWITCHSTATE of
+each set. These functions determine the active limit set for every sample and
+find all limit violations without looping over the individual samples, so
+they can be used to replay G_LIMMON checking over long time periods.
+"""
+
+import numpy as np
+
+import Ska.engarchive.fetch_eng as fetch_eng
+from Chandra.Time import DateTime
+
+from greta_parse import readGLIMMON
+from gretafun import LIMITFIELDS
+
+EPISODEDTYPE = [('start', 'i8'), ('stop', 'i8'), ('tstart', 'f8'),
+                ('tstop', 'f8'), ('worst', 'f8')]
+
+
+def getLimitSetArrays(msid, glimmon):
+    """ Return all limit sets for one msid as arrays.
+
+    glimmon is the dictionary returned by readGLIMMON().
+
+    Returns a dict with these keys:
+        setkeys: array of G_LIMMON set numbers
+        switchstates: array of upper case switch states ('' if not defined)
+        default: position of the default set in the above arrays
+        mlimsw: name of the switch msid, or None
+        warning_low, caution_low, caution_high, warning_high: arrays of limit
+            values for each set (NaN if a set does not include limits)
+    """
+
+    glim = glimmon[msid.upper()]
+    setkeys = np.array(glim['setkeys'])
+
+    limitsets = {'setkeys':setkeys,
+                 'mlimsw':glim.get('mlimsw'),
+                 'switchstates':np.array([str(glim[s].get('switchstate', ''))
+                                          .strip().upper() for s in setkeys])}
+
+    for field in LIMITFIELDS:
+        limitsets[field] = np.array([glim[s].get(field, np.nan)
+                                     for s in setkeys], dtype=np.float64)
+
+    # Use the first set as the default if none is specified, to be consistent
+    # with gretafun.getGLIMMONLimits(), or if the specified default set is not
+    # one of the defined limit sets
+    default = np.flatnonzero(setkeys == glim.get('default', 0))
+    limitsets['default'] = int(default[0]) if len(default) > 0 else 0
+
+    return limitsets
+
+
+def selectLimitSets(times, limitsets, switchtimes=None, switchvals=None):
+    """ Return the position of the active limit set for each sample.
+
+    The switch msid state is held from each switch sample until the next one,
+    so the switch msid does not need to be sampled at the same times as the
+    checked msid. Samples that occur before the first switch sample, or where
+    the switch state does not match any set, use the default set.
+    """
+
+    setpos = np.full(len(times), limitsets['default'], dtype=np.int64)
+
+    if (limitsets['mlimsw'] is None or switchtimes is None or
+            len(switchtimes) == 0):
+        return setpos
+
+    # Map each unique switch state to a limit set, there are only ever a
+    # handful of these.
+    states, inverse = np.unique(np.char.upper(np.char.strip(
+        np.asarray(switchvals).astype(str))), return_inverse=True)
+    statemap = np.full(len(states), limitsets['default'], dtype=np.int64)
+    for n, state in enumerate(states):
+        match = np.flatnonzero(limitsets['switchstates'] == state)
+        if len(match) > 0:
+            statemap[n] = match[0]
+    switchpos = statemap[inverse]
+
+    ind = np.searchsorted(switchtimes, times, side='right') - 1
+    valid = ind >= 0
+    setpos[valid] = switchpos[ind[valid]]
+
+    return setpos
+
+
+def findEpisodes(mask, times, vals, worst='max'):
+    """ Return the contiguous runs of True values in mask.
+
+    Returns a structured array with one row per episode, including the start
+    and stop indices (stop is exclusive, to match Python slicing), the times
+    of the first and last violating samples, and the worst value during the
+    episode ('max' for high limits, 'min' for low limits).
+    """
+
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
+    episodes = np.zeros(len(starts), dtype=EPISODEDTYPE)
+    if len(starts) == 0:
+        return episodes
+
+    episodes['start'] = starts
+    episodes['stop'] = stops
+    episodes['tstart'] = times[starts]
+    episodes['tstop'] = times[stops - 1]
+
+    # Reduce over [start, stop) pairs only, the padding value makes a stop
+    # index equal to len(vals) valid for reduceat.
+    padded = np.concatenate((np.asarray(vals, dtype=np.float64), [0.]))
+    bounds = np.column_stack((starts, stops)).ravel()
+    if worst == 'max':
+        episodes['worst'] = np.maximum.reduceat(padded, bounds)[::2]
+    else:
+        episodes['worst'] = np.minimum.reduceat(padded, bounds)[::2]
+
+    return episodes
+
+
+def checkLimits(msid, times, vals, glimmon, switchtimes=None,
+                switchvals=None):
+    """ Check telemetry against the G_LIMMON limits for one msid.
+
+    times and vals are the telemetry for the msid, switchtimes and
+    switchvals are the telemetry for the switch msid (MLIMSW), if one is
+    defined.
+
+    Returns a dict with these keys:
+        setpos: position of the active limit set for each sample
+        setkeys: G_LIMMON set number active for each sample
+        masks: dict of boolean violation masks for each limit type, as well
+            as combined 'caution' and 'warning' masks. Caution masks include
+            samples that are also warning violations.
+        episodes: dict of episode arrays for each limit type, see
+            findEpisodes()
+    """
+
+    times = np.asarray(times)
+    vals = np.asarray(vals, dtype=np.float64)
+
+    limitsets = getLimitSetArrays(msid, glimmon)
+    setpos = selectLimitSets(times, limitsets, switchtimes, switchvals)
+
+    masks = {}
+    episodes = {}
+    for field in LIMITFIELDS:
+        limits = limitsets[field][setpos]
+        if 'low' in field:
+            masks[field] = vals < limits
+            worst = 'min'
+        else:
+            masks[field] = vals > limits
+            worst = 'max'
+        episodes[field] = findEpisodes(masks[field], times, vals, worst=worst)
+
+    masks['caution'] = masks['caution_low'] | masks['caution_high']
+    masks['warning'] = masks['warning_low'] | masks['warning_high']
+
+    return {'setpos':setpos,
+            'setkeys':limitsets['setkeys'][setpos],
+            'masks':masks,
+            'episodes':episodes}
+
+
+def fetchAndCheckLimits(msid, tstart, tstop, glimmon=None):
+    """ Fetch telemetry from the engineering archive and check the limits.
+
+    The switch msid is fetched as well if the msid uses multiple limit sets.
+    See checkLimits() for a description of the returned data.
+    """
+
+    if not glimmon:
+        glimmon = readGLIMMON()
+
+    tstart = DateTime(tstart).secs
+    tstop = DateTime(tstop).secs
+
+    telem = fetch_eng.Msid(msid, tstart, tstop)
+
+    switchtimes = None
+    switchvals = None
+    mlimsw = glimmon[msid.upper()].get('mlimsw')
+    if mlimsw:
+        # Grab a little extra data before the start so the switch state is
+        # known for the first samples.
+        switch = fetch_eng.Msid(mlimsw, tstart - 3600, tstop)
+        switchtimes = switch.times
+        switchvals = switch.vals
+
+    return checkLimits(msid, telem.times, telem.vals, glimmon,
+                       switchtimes=switchtimes, switchvals=switchvals)
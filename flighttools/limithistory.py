@@ -0,0 +1,152 @@
+""" Time indexed G_LIMMON limit history.
+
+The G_LIMMON database stores every modification (modversion) of every limit
+along with the date it went into effect (datesec). These tools load that
+history into sorted arrays so the limits in effect at any number of times can
+be looked up with a single searchsorted call, rather than one query per time.
+"""
+
+import numpy as np
+import sqlite3
+
+from gretafun import GLIMMONDB, LIMITFIELDS
+
+
+class LimitHistory(object):
+    """ Limits in effect over time for a single msid.
+
+    datesecs is a sorted array of times (in seconds) at which each limit
+    definition went into effect. warning_low, caution_low, caution_high, and
+    warning_high are arrays of the limit values, one per entry in datesecs.
+    Disabled limits (mlmenable == 0) should be stored as NaN.
+    """
+
+    def __init__(self, msid, datesecs, limits):
+        self.msid = msid.lower()
+        self.datesecs = np.asarray(datesecs, dtype=np.float64)
+        for field in LIMITFIELDS:
+            self.__dict__[field] = np.asarray(limits[field], dtype=np.float64)
+
+    def indexAt(self, times):
+        """ Return the index of the limit definition in effect at each time.
+
+        Times before the first limit definition return -1.
+        """
+        return np.searchsorted(self.datesecs, np.asarray(times),
+                               side='right') - 1
+
+    def limitsAt(self, times):
+        """ Return the limits in effect at each time.
+
+        Returns a dict of arrays keyed by limit type, NaN is returned for
+        times before the msid had limits defined.
+        """
+
+        ind = self.indexAt(times)
+        valid = ind >= 0
+
+        limits = {}
+        for field in LIMITFIELDS:
+            vals = np.full(len(ind), np.nan)
+            vals[valid] = self.__dict__[field][ind[valid]]
+            limits[field] = vals
+
+        return limits
+
+    def checkAt(self, times, vals):
+        """ Check telemetry against the limits in effect at each sample.
+
+        Returns a dict of boolean violation masks keyed by limit type.
+        Caution masks include samples that are also warning violations.
+        """
+
+        vals = np.asarray(vals, dtype=np.float64)
+        limits = self.limitsAt(times)
+
+        masks = {}
+        for field in LIMITFIELDS:
+            if 'low' in field:
+                masks[field] = vals < limits[field]
+            else:
+                masks[field] = vals > limits[field]
+
+        return masks
+
+
+_HISTORYQUERY = '''SELECT msid, datesec, mlmenable, warning_low, caution_low,
+                   caution_high, warning_high FROM limits WHERE {}
+                   ORDER BY msid, datesec, modversion'''
+
+
+def _historyFromRows(msid, rows):
+    """ Generate a LimitHistory object from (msid, datesec, mlmenable, limits)
+    rows sorted by datesec.
+    """
+
+    dtype = ([('msid', 'U20'), ('datesec', 'f8'), ('mlmenable', 'f8')] +
+             [(f, 'f8') for f in LIMITFIELDS])
+    data = np.array([tuple(np.nan if v is None else v for v in r)
+                     for r in rows], dtype=dtype)
+
+    disabled = data['mlmenable'] == 0
+    limits = {}
+    for field in LIMITFIELDS:
+        limits[field] = np.where(disabled, np.nan, data[field])
+
+    return LimitHistory(msid, data['datesec'], limits)
+
+
+def getLimitHistory(msid, setkey=None, dbfile=GLIMMONDB):
+    """ Return the limit history for one msid.
+
+    If setkey is None, the history of the default limit set is returned,
+    following any changes to which set is the default. Otherwise the history
+    of the specified limit set is returned.
+    """
+
+    db = sqlite3.connect(dbfile)
+    cursor = db.cursor()
+
+    if setkey is None:
+        cursor.execute(_HISTORYQUERY.format('msid = ? AND setkey = default_set'),
+                       [msid.lower(),])
+    else:
+        cursor.execute(_HISTORYQUERY.format('msid = ? AND setkey = ?'),
+                       [msid.lower(), int(setkey)])
+    rows = cursor.fetchall()
+    db.close()
+
+    if not rows:
+        raise KeyError('{} not in G_LIMMON Database'.format(msid))
+
+    return _historyFromRows(msid, rows)
+
+
+def buildLimitHistoryIndex(dbfile=GLIMMONDB):
+    """ Return the default limit set history for all msids.
+
+    All rows are read in one query and split by msid, the returned dict is
+    keyed by lower case msid name with LimitHistory objects as values.
+    """
+
+    db = sqlite3.connect(dbfile)
+    cursor = db.cursor()
+    cursor.execute(_HISTORYQUERY.format('setkey = default_set'))
+    rows = cursor.fetchall()
+    db.close()
+
+    if not rows:
+        return {}
+
+    # Rows are already sorted by msid, so each msid is a contiguous block.
+    msids = np.array([r[0].lower() for r in rows])
+    _, starts = np.unique(msids, return_index=True)
+    starts = np.sort(starts)
+    stops = np.append(starts[1:], len(rows))
+
+    index = {}
+    for start, stop in zip(starts, stops):
+        msid = str(msids[start])
+        index[msid] = _historyFromRows(msid, rows[start:stop])
+
+    return index
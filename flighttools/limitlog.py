@@ -0,0 +1,293 @@
+""" Mergeable summaries of GRETA limits files.
+
+The per-msid summary produced by greta_parse.process_limits_file() depends
+on the order of all lines for that msid, so two summaries can not simply be
+combined. LimitLogState keeps a little more information for each msid so that
+the states of consecutive files can be merged. Merging is associative, so
+many files can be processed in parallel and reduced in any grouping, as long
+as the files are kept in time order. The result is identical to processing
+the files concatenated in time order.
+"""
+
+import numpy as np
+from multiprocessing import Pool
+
+from Chandra.Time import DateTime
+
+from greta_parse import read_limits_file, get_tdb_metadata
+
+
+def _iswc(msg):
+    return 'WARNING' in msg or 'CAUTION' in msg
+
+
+class _MSIDState(object):
+    """ Summary of the limits file lines for one msid over a time period.
+
+    Violations are numbered in time order starting at 0 (the first
+    violation); these ranks are offset when two states are merged.
+    """
+
+    __slots__ = ['nrows', 'nominalfirst', 'nnominal', 'lastnominal', 'first',
+                 'nviolations', 'num', 'endtime', 'wcmax', 'wcmin',
+                 'lastviolation', 'lastnoncaution', 'nonwc']
+
+    def __init__(self, time, msg, value, limit):
+        """ Create the state for a single line.
+        """
+
+        self.nrows = 1
+        self.nominalfirst = msg == 'NOMINAL'
+        self.num = 0
+        self.endtime = None
+        self.wcmax = -np.inf
+        self.wcmin = np.inf
+        self.lastnoncaution = None
+
+        if msg == 'NOMINAL':
+            self.nnominal = 1
+            self.lastnominal = time
+            self.first = None
+            self.nviolations = 0
+            self.lastviolation = None
+            self.nonwc = []
+        else:
+            self.nnominal = 0
+            self.lastnominal = None
+            self.first = (time, msg, value, limit)
+            self.nviolations = 1
+            self.lastviolation = (0, msg, limit)
+            if _iswc(msg):
+                self.wcmax = float(value)
+                self.wcmin = float(value)
+                self.nonwc = []
+            else:
+                self.nonwc = [value]
+            if 'CAUTION' not in msg or 'WARNING' in msg:
+                self.lastnoncaution = (0, msg, limit)
+
+    def append(self, time, msg, value, limit):
+        """ Add a single line in place, this is the same as merging the state
+        for that line but does not copy the accumulated values.
+        """
+
+        self.nrows = self.nrows + 1
+
+        if msg == 'NOMINAL':
+            self.nnominal = self.nnominal + 1
+            self.lastnominal = time
+            # Returns to nominal are only counted after the first violation
+            if self.first is not None:
+                self.num = self.num + 1
+                self.endtime = time
+            return
+
+        rank = self.nviolations
+        self.nviolations = rank + 1
+        if self.first is None:
+            self.first = (time, msg, value, limit)
+
+        if _iswc(msg):
+            self.wcmax = max(self.wcmax, float(value))
+            self.wcmin = min(self.wcmin, float(value))
+        else:
+            self.nonwc.append(value)
+
+        self.lastviolation = (rank, msg, limit)
+        if 'CAUTION' not in msg or 'WARNING' in msg:
+            self.lastnoncaution = (rank, msg, limit)
+
+    def merge(self, other):
+        """ Return the merged state of this period followed by other.
+        """
+
+        def shift(entry):
+            return (entry[0] + self.nviolations,) + entry[1:]
+
+        merged = _MSIDState.__new__(_MSIDState)
+        merged.nrows = self.nrows + other.nrows
+        merged.nominalfirst = self.nominalfirst
+        merged.nnominal = self.nnominal + other.nnominal
+        if other.lastnominal is not None:
+            merged.lastnominal = other.lastnominal
+        else:
+            merged.lastnominal = self.lastnominal
+        merged.nviolations = self.nviolations + other.nviolations
+        merged.wcmax = max(self.wcmax, other.wcmax)
+        merged.wcmin = min(self.wcmin, other.wcmin)
+        merged.nonwc = self.nonwc + other.nonwc
+
+        # Returns to nominal are only counted after the first violation
+        if self.first is not None:
+            merged.first = self.first
+            merged.num = self.num + other.nnominal
+            if other.lastnominal is not None:
+                merged.endtime = other.lastnominal
+            else:
+                merged.endtime = self.endtime
+        else:
+            merged.first = other.first
+            merged.num = other.num
+            merged.endtime = other.endtime
+
+        if other.lastviolation is not None:
+            merged.lastviolation = shift(other.lastviolation)
+        else:
+            merged.lastviolation = self.lastviolation
+
+        if other.lastnoncaution is not None:
+            merged.lastnoncaution = shift(other.lastnoncaution)
+        else:
+            merged.lastnoncaution = self.lastnoncaution
+
+        return merged
+
+    def entry(self, owner, description, dates):
+        """ Return the process_limits_file() dict entry for this msid.
+
+        dates is a dict of date strings keyed by time in seconds.
+        """
+
+        entry = {'owner':owner, 'description':description, 'num':self.num}
+
+        if self.nominalfirst:
+            entry['comment'] = 'return to nominal is observed before violation'
+
+        if self.first is None:
+            return entry
+
+        time, msg, value, limit = self.first
+        entry['firstviolation'] = dates[time]
+
+        # The worst type (and limit) is the last non-caution violation if it
+        # is a warning, otherwise it is the last violation. See
+        # greta_parse.summarize_limits() for more details.
+        worst = self.lastnoncaution
+        if worst is None:
+            worst = (0, msg, limit)
+        if 'WARNING' not in worst[1]:
+            worst = self.lastviolation
+        entry['worsttype'] = worst[1]
+
+        if msg == 'OUT-OF-STATE':
+            entry['statelog'] = list(self.nonwc)
+            entry['initialvalue'] = value
+            entry['limit'] = worst[2]
+        else:
+            firstval = float(value)
+            entry['max'] = np.max([self.wcmax, firstval])
+            entry['min'] = np.min([self.wcmin, firstval])
+            entry['initialvalue'] = firstval
+            if worst[0] == 0:
+                entry['limit'] = float(worst[2])
+            else:
+                entry['limit'] = worst[2]
+
+        if self.endtime is not None:
+            entry['endtime'] = dates[self.endtime]
+
+        return entry
+
+
+class LimitLogState(object):
+    """ Mergeable summary of one or more GRETA limits files.
+
+    Use merge() to combine the states of consecutive files and limlog() to
+    return the summary in the process_limits_file() format.
+    """
+
+    def __init__(self):
+        self.msids = {}
+
+    @classmethod
+    def from_file(cls, filename):
+        """ Return the state for one limits file.
+        """
+
+        state = cls()
+        data = read_limits_file(filename)
+        data = data[data['valid']]
+        for time, msid, msg, value, limit in zip(
+                data['time'].tolist(), data['msid'].tolist(),
+                data['msg'].tolist(), data['value'].tolist(),
+                data['limit'].tolist()):
+            state.add_line(time, msid, msg, value, limit)
+        return state
+
+    def add_line(self, time, msid, msg, value, limit):
+        """ Add one limits file line, this must be later than all prior lines.
+
+        The msid state is updated in place, so this should only be used while
+        building the state for a file, not on a state returned by merge().
+        """
+        if msid in self.msids:
+            self.msids[msid].append(time, msg, value, limit)
+        else:
+            self.msids[msid] = _MSIDState(time, msg, value, limit)
+
+    def merge(self, other):
+        """ Return the merged state of this period followed by other.
+        """
+
+        merged = LimitLogState()
+        merged.msids.update(self.msids)
+        for msid, state in other.msids.items():
+            if msid in merged.msids:
+                merged.msids[msid] = merged.msids[msid].merge(state)
+            else:
+                merged.msids[msid] = state
+        return merged
+
+    def limlog(self):
+        """ Return the summary in the process_limits_file() format.
+        """
+
+        times = set()
+        for state in self.msids.values():
+            if state.first is not None:
+                times.add(state.first[0])
+            if state.endtime is not None:
+                times.add(state.endtime)
+
+        times = sorted(times)
+        dates = {}
+        if times:
+            dates = dict(zip(times, np.atleast_1d(DateTime(times).date)))
+            dates = {t:str(d) for t, d in dates.items()}
+
+        tdbmetadata = get_tdb_metadata(self.msids.keys())
+
+        return {msid:state.entry(tdbmetadata[msid][0], tdbmetadata[msid][1],
+                                 dates)
+                for msid, state in self.msids.items()}
+
+
+def _treereduce(states):
+    """ Merge a time ordered list of states pairwise.
+    """
+    while len(states) > 1:
+        merged = [states[n].merge(states[n + 1])
+                  for n in range(0, len(states) - 1, 2)]
+        if len(states) % 2:
+            merged.append(states[-1])
+        states = merged
+    return states[0] if states else LimitLogState()
+
+
+def process_limits_files(filenames, processes=4):
+    """ Summarize many GRETA limits files in parallel.
+
+    filenames must be in time order. Each file is processed in a separate
+    process and the results are merged pairwise. Returns a dict in the same
+    format as greta_parse.process_limits_file(), identical to processing the
+    concatenated files.
+    """
+
+    pool = Pool(processes)
+    try:
+        states = pool.map(LimitLogState.from_file, filenames)
+    finally:
+        pool.close()
+        pool.join()
+
+    return _treereduce(states).limlog()
@@ -58,6 +58,10 @@ class MSIDTrend(object):
                standard deviation, please see the documentation for the Numpy
                std() function.
 
+    exclusions: An exclusions.ExclusionTable of time periods to leave out of
+                the monthly data (e.g. safe modes). If this is None, no time
+                periods are excluded.
+
                
     ---------------------------------------------------------------------------
     Creates an object with these attributes:
@@ -97,7 +101,7 @@ class MSIDTrend(object):
     
     def __init__(self, msid, tstart='2000:001:00:00:00', tstop=None,
                  trendmonths = 36, numstddev=2, removeoutliers=True, 
-                 maxoutlierstddev=5):
+                 maxoutlierstddev=5, exclusions=None):
 
         self.msid = msid
         self.tstart = DateTime(tstart).date
@@ -111,6 +115,7 @@ class MSIDTrend(object):
         self.numstddev = numstddev
         self.removeoutliers = removeoutliers
         self.maxoutlierstddev = maxoutlierstddev
+        self.exclusions = exclusions
         self.telem = self._getMonthlyTelemetry()
         self.safetylimits = pylimmon.get_safety_limits(msid)
 
@@ -170,6 +175,8 @@ class MSIDTrend(object):
         # Save this for future access outside of this function, you need to 
         # merge the keep arrays since they all share a common time array.
         keep = keepmean & keepmax & keepmin
+        if self.exclusions is not None:
+            keep = keep & self.exclusions.keepMask(telem.times)
         telem.keep = keep
 
 
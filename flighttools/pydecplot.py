@@ -402,8 +402,22 @@ class plotdec(object):
                              family='monospace', color=self.plotinfo['fgcolor'])
 
 
+    def _getplotpixels(self, plotnum, lttplot=False):
+        # Approximate width of the plot axes in pixels when saved, used to
+        # decimate the plotted data.
+        dpi = plt.rcParams['savefig.dpi']
+        if dpi == 'figure':
+            dpi = plt.rcParams['figure.dpi']
+        if lttplot:
+            plotloc = self.plotinfo['lttslocation'][plotnum]
+        else:
+            plotloc = self.plotinfo['location'][plotnum]
+        return int(self.plotinfo['width'] * plotloc[2] * dpi)
+
+
     def _getplotdata(self, plotnum, tracenum, time1=None, 
-                     fetchstat=None, plotstat=None, binaryplot=False):
+                     fetchstat='auto', plotstat=None, binaryplot=False,
+                     lttplot=False):
 
         # Figure out what the MSID name is
         if binaryplot:
@@ -438,7 +452,9 @@ class plotdec(object):
         try:
             tracedata = decplotdata.plotdata(name, time1, self.time2, 
                                              plotstat=tstat, 
-                                             fetchstat=fetchstat)
+                                             fetchstat=fetchstat,
+                                             pixels=self._getplotpixels(
+                                                 plotnum, lttplot=lttplot))
             telem = tracedata.telem
             del tracedata.telem
 
@@ -529,7 +545,8 @@ class plotdec(object):
             oneyearago = ct.DateTime(oneyearago).date
             telem, tracedata = self._getplotdata(plotnum, tracenum, 
                                                   time1=oneyearago,
-                                                  fetchstat='daily')
+                                                  fetchstat='daily',
+                                                  lttplot=True)
 
             # Plot the data
             if telem:
@@ -595,8 +612,10 @@ class plotdec(object):
         msidkey = {}
         for tbtracenum in list(self.decplots['plots'][plotnum]['tbtraces'].keys()):
 
-            # Fetch telemetry and return name of MSID/Data
+            # Fetch telemetry and return name of MSID/Data, on/off states
+            # are always fetched at full resolution
             tbtelem, tbtracedata = self._getplotdata(plotnum, tbtracenum, 
+                                                     fetchstat=None,
                                                      binaryplot=True)
 
             offval = tbtracenum * 2
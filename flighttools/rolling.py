@@ -0,0 +1,79 @@
+""" Rolling maximum and minimum over a time window.
+
+Uses the van Herk/Gil-Werman algorithm with blocks defined in time rather
+than by sample count, so irregular sampling and gaps are handled correctly.
+The samples are split into consecutive blocks one window wide. The trailing
+window [t - window, t] for a sample in block k always starts in block k - 1
+or at the start of block k, so its extreme value is the larger (or smaller)
+of the suffix extreme of block k - 1 from the window start and the prefix
+extreme of block k up to the sample.
+
+The prefix and suffix extremes of all blocks are calculated at once with a
+segmented scan over the flat sample array: at each step every sample is
+combined with the sample 1, 2, 4, ... positions earlier when that sample is
+in the same block. Memory use is O(n) regardless of how unevenly the samples
+are spread over the blocks, and the cost is O(n log m) for blocks of at most
+m samples, with no per-sample Python loops.
+
+Times must be sorted.
+"""
+
+import numpy as np
+
+
+def _segmentedScan(vals, positions, ufunc):
+    """ Return the inclusive prefix scan of ufunc within each block.
+
+    positions is the position of each sample within its block, so a block
+    starts wherever positions is 0.
+    """
+
+    result = vals.copy()
+    step = 1
+    maxposition = positions.max()
+    while step <= maxposition:
+        ind = np.flatnonzero(positions >= step)
+        result[ind] = ufunc(result[ind], result[ind - step])
+        step = step * 2
+    return result
+
+
+def _rollingExtreme(times, vals, window, ufunc):
+
+    times = np.asarray(times, dtype=np.float64)
+    vals = np.asarray(vals, dtype=np.float64)
+    numsamples = len(times)
+    if numsamples == 0:
+        return vals.copy()
+
+    blocks = np.floor((times - times[0]) / window).astype(np.int64)
+    newblock = np.ones(numsamples, dtype=bool)
+    newblock[1:] = blocks[1:] != blocks[:-1]
+    starts = np.flatnonzero(newblock)
+    lengths = np.diff(np.append(starts, numsamples))
+
+    # Position of each sample from the start and from the end of its block
+    positions = np.arange(numsamples) - np.repeat(starts, lengths)
+    rpositions = np.repeat(lengths, lengths) - 1 - positions
+
+    prefix = _segmentedScan(vals, positions, ufunc)
+    suffix = _segmentedScan(vals[::-1], rpositions[::-1], ufunc)[::-1]
+
+    left = np.searchsorted(times, times - window, side='left')
+    sameblock = blocks[left] == blocks
+
+    return np.where(sameblock, prefix, ufunc(suffix[left], prefix))
+
+
+def rollingMax(times, vals, window=86400.0):
+    """ Return the maximum value over the trailing time window (in seconds)
+    ending at each sample, including samples exactly one window earlier.
+    """
+    return _rollingExtreme(times, vals, window, np.maximum)
+
+
+def rollingMin(times, vals, window=86400.0):
+    """ Return the minimum value over the trailing time window (in seconds)
+    ending at each sample, including samples exactly one window earlier.
+    """
+    return _rollingExtreme(times, vals, window, np.minimum)
@@ -0,0 +1,198 @@
+#!/usr/bin/python
+""" Stored daily statistics for state msids.
+
+The engineering archive does not include 5min or daily stats for state msids
+such as heater on/off states, so daily means (duty cycles for on/off msids)
+would otherwise have to be calculated from the full resolution data every
+time they are plotted. This module keeps those daily stats in a sqlite
+database.
+
+Only complete days are stored. Each update starts at the end of the last
+stored day, so the database can be filled once and then extended with a
+daily cron job. Days after the last update are calculated from the archive
+when they are requested.
+
+Example:
+
+   python statestats.py --dbfile=statestats.sqlite3 4OHTRZ53 4OHTRZ54
+"""
+
+import os
+import sqlite3
+import argparse
+import numpy as np
+
+import Ska.engarchive.fetch_eng as fetch_eng
+from Chandra.Time import DateTime
+
+import binning
+import fetchcache
+
+
+STATESTATSDB = '/home/mdahmer/AXAFAUTO/StateStats/statestats.sqlite3'
+
+DAY = 86400.0
+
+STATCOLUMNS = ['times', 'means', 'mins', 'maxes', 'stds', 'midvals', 'samples']
+
+
+def createStateStatsDB(db):
+    """ Create the tables if they do not already exist.
+
+    daily_stats holds one row per msid per day (day = floor(time / 86400)),
+    state_msids holds the time each msid has been processed up to.
+    """
+
+    cursor = db.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS daily_stats (msid TEXT,
+                      day INTEGER, {} , PRIMARY KEY (msid, day))'''.format(
+                      ', '.join(STATCOLUMNS)))
+    cursor.execute('''CREATE TABLE IF NOT EXISTS state_msids (msid TEXT
+                      PRIMARY KEY, tstart REAL, tstop REAL)''')
+    db.commit()
+
+
+def _statevals(telem):
+    """ Return numeric values for a fetched msid, state msids use the absolute
+    raw values as in decplotdata.plotdata.
+    """
+    if len(telem.vals) > 0 and isinstance(telem.vals[0], str):
+        return np.abs(telem.raw_vals)
+    return telem.vals
+
+
+def calcDailyStats(telem):
+    """ Return the daily stats for a fetched msid, see binning.py.
+    """
+    return binning.getBinnedStats(telem.times, _statevals(telem), 'daily')
+
+
+def updateStateStats(msid, db, tstart='2000:001:00:00:00', tstop=None,
+                     chunkdays=30):
+    """ Add the complete days since the last update for one msid.
+
+    tstart is only used the first time an msid is added. Data are fetched
+    chunkdays at a time to limit memory use. Returns the number of days
+    added.
+    """
+
+    msid = msid.lower()
+    cursor = db.cursor()
+    cursor.execute('SELECT tstop FROM state_msids WHERE msid = ?', [msid,])
+    row = cursor.fetchone()
+
+    if row is None:
+        t1 = np.floor(DateTime(tstart).secs / DAY) * DAY
+        cursor.execute('INSERT INTO state_msids VALUES (?, ?, ?)',
+                       [msid, t1, t1])
+    else:
+        t1 = row[0]
+
+    # Only complete days are stored
+    t2 = np.floor(DateTime(tstop).secs / DAY) * DAY
+
+    numdays = 0
+    while t1 < t2:
+        chunkstop = min(t1 + chunkdays * DAY, t2)
+        telem = fetch_eng.Msid(msid, t1, chunkstop)
+        stats = calcDailyStats(telem)
+
+        days = np.floor(stats['times'] / DAY).astype(np.int64)
+        rows = zip([msid] * len(days), days.tolist(),
+                   *[stats[c].tolist() for c in STATCOLUMNS])
+
+        with db:
+            db.executemany('INSERT OR REPLACE INTO daily_stats VALUES ({})'.format(
+                ', '.join(['?'] * (len(STATCOLUMNS) + 2))), rows)
+            db.execute('UPDATE state_msids SET tstop = ? WHERE msid = ?',
+                       [chunkstop, msid])
+
+        numdays = numdays + len(days)
+        t1 = chunkstop
+
+    db.commit()
+    return numdays
+
+
+def updateStateStatsDB(msids, dbfile=STATESTATSDB, tstart='2000:001:00:00:00',
+                       tstop=None):
+    """ Update the stored daily stats for a list of state msids.
+
+    Returns a dict of msids that could not be updated along with the
+    associated error messages.
+    """
+
+    db = sqlite3.connect(dbfile)
+    createStateStatsDB(db)
+
+    errors = {}
+    for msid in msids:
+        try:
+            numdays = updateStateStats(msid, db, tstart=tstart, tstop=tstop)
+            print('Added {} days for {}'.format(numdays, msid))
+        except ValueError as e:
+            errors[msid] = str(e)
+            print('Could not update {}: {}'.format(msid, e))
+
+    db.close()
+    return errors
+
+
+def getStateStats(msid, tstart, tstop, dbfile=STATESTATSDB):
+    """ Return the daily stats for a state msid between tstart and tstop.
+
+    Stored days are read from the database, any days after the last update
+    are calculated from the archive. Returns None if the msid is not in the
+    database, otherwise a dict of arrays in the binning.getBinnedStats()
+    format.
+    """
+
+    if not os.path.exists(dbfile):
+        return None
+
+    tstart = DateTime(tstart).secs
+    tstop = DateTime(tstop).secs
+
+    db = sqlite3.connect(dbfile)
+    cursor = db.cursor()
+    cursor.execute('SELECT tstop FROM state_msids WHERE msid = ?',
+                   [msid.lower(),])
+    row = cursor.fetchone()
+    if row is None:
+        db.close()
+        return None
+
+    tdone = row[0]
+    cursor.execute('''SELECT {} FROM daily_stats WHERE msid = ? AND day >= ?
+                      AND day < ? ORDER BY day'''.format(', '.join(STATCOLUMNS)),
+                   [msid.lower(), int(np.floor(tstart / DAY)),
+                    int(np.ceil(min(tstop, tdone) / DAY))])
+    rows = cursor.fetchall()
+    db.close()
+
+    stats = {}
+    for n, column in enumerate(STATCOLUMNS):
+        dtype = np.int64 if column == 'samples' else np.float64
+        stats[column] = np.array([r[n] for r in rows], dtype=dtype)
+
+    if tstop > tdone:
+        telem = fetchcache.fetchMsid(msid, max(tdone, tstart), tstop)
+        recent = calcDailyStats(telem)
+        for column in STATCOLUMNS:
+            stats[column] = np.concatenate((stats[column], recent[column]))
+
+    return stats
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('msids', nargs='+')
+    parser.add_argument('--dbfile', default=STATESTATSDB)
+    parser.add_argument('--tstart', default='2000:001:00:00:00')
+
+    args = vars(parser.parse_args())
+
+    updateStateStatsDB(args['msids'], dbfile=args['dbfile'],
+                       tstart=args['tstart'])
@@ -0,0 +1,91 @@
+""" Mergeable summary statistics.
+
+SummaryStats holds the count, mean, sum of squared deviations from the mean
+(M2), minimum, and maximum of a set of values. Two SummaryStats objects can
+be merged with the parallel form of Welford's algorithm (Chan et al.), so
+stats for separate time ranges, or for the bins of 5min or daily data, can
+be combined without going back to the original data.
+"""
+
+import numpy as np
+
+
+class SummaryStats(object):
+    """ Count, mean, M2, min, and max of a set of values.
+
+    std and var are the population standard deviation and variance, as
+    returned by np.std and np.var.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=np.inf, max=-np.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    @classmethod
+    def fromArray(cls, vals, blocksize=65536):
+        """ Calculate the stats for an array of values.
+
+        The array is processed in blocks small enough to stay in the CPU
+        cache, so all statistics are calculated in what amounts to a single
+        pass through memory, without a full size floating point copy.
+        """
+
+        vals = np.asarray(vals)
+        stats = cls()
+        for start in range(0, len(vals), blocksize):
+            block = np.asarray(vals[start:start + blocksize], dtype=np.float64)
+            mean = np.mean(block)
+            deviations = block - mean
+            stats = stats.merge(cls(len(block), mean,
+                                    np.dot(deviations, deviations),
+                                    np.min(block), np.max(block)))
+        return stats
+
+    @classmethod
+    def fromBins(cls, counts, means, stds, mins, maxes):
+        """ Calculate the stats for binned data, such as the 5min or daily
+        stats in the engineering archive, from the stats of each bin.
+        """
+
+        counts = np.asarray(counts, dtype=np.float64)
+        means = np.asarray(means, dtype=np.float64)
+        stds = np.asarray(stds, dtype=np.float64)
+
+        count = np.sum(counts)
+        if count == 0:
+            return cls()
+
+        mean = np.dot(counts, means) / count
+        m2 = np.dot(counts, stds**2) + np.dot(counts, (means - mean)**2)
+        return cls(int(count), mean, m2, np.min(mins), np.max(maxes))
+
+    def merge(self, other):
+        """ Return the stats for the values in both objects.
+        """
+
+        if other.count == 0:
+            return SummaryStats(self.count, self.mean, self.m2, self.min,
+                                self.max)
+        if self.count == 0:
+            return SummaryStats(other.count, other.mean, other.m2, other.min,
+                                other.max)
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        mean = self.mean + delta * other.count / count
+        m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        return SummaryStats(count, mean, m2, np.min((self.min, other.min)),
+                            np.max((self.max, other.max)))
+
+    @property
+    def var(self):
+        if self.count == 0:
+            return np.nan
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
@@ -0,0 +1,255 @@
+#!/usr/bin/python
+""" Scan the engineering archive for historical G_LIMMON limit violations.
+
+Every limit type msid in G_LIMMON is checked over the requested time range,
+one time chunk at a time, using the vectorized checks in limitcheck.py. The
+caution and warning episodes for each msid are saved to a separate file in
+the output directory. Each msid file also records how far the scan has
+progressed, so an interrupted scan picks up where it left off when it is run
+again with the same output directory.
+
+Example:
+
+   python violationscan.py --tstart=2000:001 --tstop=2018:001 \
+   --outdir=violations --processes=8
+"""
+
+import os
+import json
+import pickle
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+import Ska.engarchive.fetch_eng as fetch_eng
+from Chandra.Time import DateTime
+
+from greta_parse import readGLIMMON
+import limitcheck
+
+
+STATUSFILE = 'scan_status.json'
+
+# The glimmon dict used by each worker process, set once per process by
+# _initworker() so it is not pickled with every msid.
+_workerglimmon = None
+
+
+def _msidfile(outdir, msid):
+    return os.path.join(outdir, msid.lower() + '.pkl')
+
+
+def _save(filename, data):
+    """ Write the data to a temporary file first so an interrupted write
+    never corrupts an existing checkpoint.
+    """
+    tmpfile = filename + '.tmp'
+    with open(tmpfile, 'wb') as fid:
+        pickle.dump(data, fid, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpfile, filename)
+
+
+def loadScanResults(outdir, msid):
+    """ Return the saved scan results for one msid.
+
+    The returned dict includes the episodes for each limit type as
+    structured arrays with tstart, tstop, and worst fields.
+    """
+    with open(_msidfile(outdir, msid), 'rb') as fid:
+        return pickle.load(fid)
+
+
+def _newstate(msid, tstart):
+    dtype = [('tstart', 'f8'), ('tstop', 'f8'), ('worst', 'f8')]
+    return {'msid':msid,
+            'tstart':tstart,
+            'tdone':tstart,
+            'complete':False,
+            'error':None,
+            'open':{f:False for f in limitcheck.LIMITFIELDS},
+            'episodes':{f:np.zeros(0, dtype=dtype)
+                        for f in limitcheck.LIMITFIELDS}}
+
+
+def _appendepisodes(state, field, episodes, numsamples):
+    """ Add the episodes from one chunk to the saved episodes.
+
+    An episode that runs up to the end of the previous chunk and continues
+    at the start of this chunk is merged into a single episode.
+    """
+
+    saved = state['episodes'][field]
+    new = np.zeros(len(episodes), dtype=saved.dtype)
+    for name in saved.dtype.names:
+        new[name] = episodes[name]
+
+    if state['open'][field] and len(new) > 0 and episodes['start'][0] == 0:
+        last = saved[-1].copy()
+        last['tstop'] = new['tstop'][0]
+        if 'low' in field:
+            last['worst'] = min(last['worst'], new['worst'][0])
+        else:
+            last['worst'] = max(last['worst'], new['worst'][0])
+        saved = np.concatenate((saved[:-1], [last], new[1:]))
+    else:
+        saved = np.concatenate((saved, new))
+
+    state['episodes'][field] = saved
+    state['open'][field] = (len(episodes) > 0 and
+                            episodes['stop'][-1] == numsamples)
+
+
+def scanMSID(msid, tstart, tstop, outdir, glimmon, chunkdays=30):
+    """ Scan one msid for limit violations, resuming from any saved state.
+
+    The saved state is written after each chunk. Returns the msid name and
+    either None or the error message if the msid could not be scanned. Any
+    error is recorded for this msid rather than raised, so one bad msid does
+    not stop the rest of the scan.
+    """
+
+    filename = _msidfile(outdir, msid)
+    tstart = DateTime(tstart).secs
+    tstop = DateTime(tstop).secs
+    chunk = chunkdays * 24 * 3600.
+
+    if os.path.exists(filename):
+        state = loadScanResults(outdir, msid)
+    else:
+        state = _newstate(msid, tstart)
+
+    while state['tdone'] < tstop:
+        t1 = state['tdone']
+        t2 = min(t1 + chunk, tstop)
+
+        try:
+            mlimsw = glimmon[msid].get('mlimsw')
+            telem = fetch_eng.Msid(msid, t1, t2)
+            switchtimes = None
+            switchvals = None
+            if mlimsw:
+                switch = fetch_eng.Msid(mlimsw, t1 - 3600, t2)
+                switchtimes = switch.times
+                switchvals = switch.vals
+
+            result = None
+            if len(telem.times) > 0:
+                result = limitcheck.checkLimits(msid, telem.times, telem.vals,
+                                                glimmon,
+                                                switchtimes=switchtimes,
+                                                switchvals=switchvals)
+
+        except Exception as e:
+            state['error'] = '{}: {}'.format(type(e).__name__, e)
+            _save(filename, state)
+            return msid, state['error']
+
+        if result is not None:
+            for field in limitcheck.LIMITFIELDS:
+                _appendepisodes(state, field, result['episodes'][field],
+                                len(telem.times))
+        else:
+            # A gap in the data ends any open episodes
+            state['open'] = {f:False for f in limitcheck.LIMITFIELDS}
+
+        state['tdone'] = t2
+        _save(filename, state)
+
+    state['complete'] = True
+    state['error'] = None
+    _save(filename, state)
+
+    return msid, None
+
+
+def _initworker(glimmon):
+    global _workerglimmon
+    _workerglimmon = glimmon
+
+
+def _scanworker(args):
+    msid, tstart, tstop, outdir, chunkdays = args
+    return scanMSID(msid, tstart, tstop, outdir, _workerglimmon,
+                    chunkdays=chunkdays)
+
+
+def getLimitMSIDs(glimmon):
+    """ Return a sorted list of all limit type msids in the glimmon dict.
+    """
+    return sorted([name for name in glimmon.keys()
+                   if isinstance(glimmon[name], dict) and
+                   glimmon[name].get('type') == 'limit'])
+
+
+def scanViolations(tstart, tstop, outdir, glimmon=None, msids=None,
+                   chunkdays=30, processes=4):
+    """ Scan all limit type G_LIMMON msids for caution and warning violations.
+
+    The msids are distributed across a pool of processes. Msids that were
+    completed in a previous run with the same output directory are skipped,
+    and partially completed msids, including those that stopped on an error,
+    resume from their last saved chunk.
+
+    Returns a dict of msids that could not be scanned along with the
+    associated error messages.
+    """
+
+    if not glimmon:
+        glimmon = readGLIMMON()
+
+    if not msids:
+        msids = getLimitMSIDs(glimmon)
+
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    statusfile = os.path.join(outdir, STATUSFILE)
+    if os.path.exists(statusfile):
+        with open(statusfile, 'r') as fid:
+            status = json.load(fid)
+    else:
+        status = {'completed':[], 'errors':{}}
+
+    completed = set(status['completed'])
+    jobs = [(msid, tstart, tstop, outdir, chunkdays)
+            for msid in msids if msid not in completed]
+
+    print('Scanning {} msids, {} already complete'.format(
+        len(jobs), len(msids) - len(jobs)))
+
+    pool = Pool(processes, initializer=_initworker, initargs=(glimmon,))
+    try:
+        for msid, error in pool.imap_unordered(_scanworker, jobs):
+            if error:
+                status['errors'][msid] = error
+            else:
+                status['errors'].pop(msid, None)
+                status['completed'].append(msid)
+
+            with open(statusfile + '.tmp', 'w') as fid:
+                json.dump(status, fid)
+            os.replace(statusfile + '.tmp', statusfile)
+    finally:
+        pool.close()
+        pool.join()
+
+    return status['errors']
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--tstart', default='2000:001:00:00:00')
+    parser.add_argument('--tstop', default=None)
+    parser.add_argument('--outdir', default='violations')
+    parser.add_argument('--glimmon',
+                        default='/home/greta/AXAFSHARE/dec/G_LIMMON.dec')
+    parser.add_argument('--chunkdays', type=float, default=30)
+    parser.add_argument('--processes', type=int, default=4)
+
+    args = vars(parser.parse_args())
+
+    scanViolations(args['tstart'], DateTime(args['tstop']).date,
+                   args['outdir'], glimmon=readGLIMMON(args['glimmon']),
+                   chunkdays=args['chunkdays'], processes=args['processes'])